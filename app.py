@@ -8,7 +8,7 @@ import elasticsearch
 from es import ElasticSearch
 from http import HTTPStatus
 
-from site_util import set_env_globals
+from site_util import set_env_globals, set_bytecode_cache
 from pyutils import *
 from pyutils.settings import config
 from gunicorn_util import *
@@ -43,6 +43,7 @@ def configure_flask_app() -> None:
 
     app.jinja_env.trim_blocks = True
     app.jinja_env.lstrip_blocks = True
+  set_bytecode_cache(app.jinja_env, 'app')
 
 def is_using_gunicorn():
   return "gunicorn" in os.environ.get("SERVER_SOFTWARE", "")
@@ -0,0 +1,70 @@
+import os
+import glob
+import shutil
+import hashlib
+from typing import List
+from pyutils import *
+
+# The css and the minified js are made by node programs, tailwind and terser, that take seconds to start.
+# They are only run again when their inputs changed: the hash of the inputs is saved next to the output.
+
+CSS = 'data/out.css'
+JS = 'data/script.min.js'
+SCRIPT = 'static_files/static/script.js'
+# The files that tailwind reads, the content globs are the ones in tailwind.config.js.
+TAILWIND_INPUTS = ['input.css', 'tailwind.config.js', 'templates/**/*.html', 'static_files/**/*.css', 'static_files/**/*.js']
+
+def inputs_hash(patterns: List[str], command: str) -> str:
+  """ A hash of the command and of the names and contents of the files that match the glob `patterns`. """
+  h = hashlib.md5(command.encode('utf-8'))
+  files = { file for pattern in patterns for file in glob.glob(pattern, recursive=True) }
+  for file in sorted(filter(os.path.isfile, files)):
+    h.update(file.encode('utf-8') + b'\0')
+    with open(file, 'rb') as f:
+      h.update(f.read())
+  return h.hexdigest()
+
+def build(output: str, inputs: List[str], command: str) -> bool:
+  """ Run `command` to make `output`, unless it was already made from the same inputs. Returns if it was run. """
+  stamp = output + '.inputs'
+  key = inputs_hash(inputs, command)
+  if exists(output) and exists(stamp) and read(stamp) == key:
+    log(f'{output} is up to date.')
+    return False
+  shell(command)
+  write(stamp, key)
+  return True
+
+def build_css() -> bool:
+  return build(CSS, TAILWIND_INPUTS, f'npx tailwindcss -i input.css -o {CSS} --minify')
+
+def build_js() -> bool:
+  return build(JS, [SCRIPT], f'terser {SCRIPT} --mangle -o {JS}')
+
+def copy_file(src: str, dst: str) -> bool:
+  """
+    Copy `src` to `dst`, unless `dst` has the same size and is newer, like make. The copy replaces `dst`
+    instead of overwriting it, like `write_replace`. Returns if it was copied.
+  """
+  src_stat = os.stat(src)
+  if exists(dst):
+    dst_stat = os.stat(dst)
+    if dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime >= src_stat.st_mtime:
+      return False
+  mkdir(os.path.dirname(dst))
+  tmp = dst + '.tmp'
+  shutil.copyfile(src, tmp)
+  os.replace(tmp, dst)
+  return True
+
+def copy_tree(src_dir: str, dst_dir: str) -> List[str]:
+  """ Copy the files in `src_dir` that changed to `dst_dir`. Returns the paths of all the files, relative to the dirs. """
+  files = []
+  copied = 0
+  for root, _, names in os.walk(src_dir):
+    for name in names:
+      path = os.path.relpath(joinp(root, name), src_dir)
+      copied += copy_file(joinp(src_dir, path), joinp(dst_dir, path))
+      files.append(path)
+  log(f'Copied {copied:,} files from {src_dir}, {len(files) - copied:,} were unchanged.')
+  return files
@@ -0,0 +1,34 @@
+import os
+import pytest
+import assets
+from pyutils import *
+from assets import *
+
+def test_build_only_runs_when_the_inputs_change(fs, monkeypatch):
+  commands = []
+  def shell(command):
+    commands.append(command)
+    write('data/out.txt', 'built', create_dirs=True)
+  monkeypatch.setattr(assets, 'shell', shell)
+  write('src/a.txt', 'a', create_dirs=True)
+
+  assert build('data/out.txt', ['src/*.txt'], 'make')
+  assert not build('data/out.txt', ['src/*.txt'], 'make')
+  write('src/b.txt', 'b')
+  assert build('data/out.txt', ['src/*.txt'], 'make')
+  assert not build('data/out.txt', ['src/*.txt'], 'make')
+  assert build('data/out.txt', ['src/*.txt'], 'make --minify')
+  assert len(commands) == 3
+
+def test_copy_tree_skips_unchanged_files(fs):
+  write('static/a.txt', 'a', create_dirs=True)
+  write('static/sub/b.txt', 'b', create_dirs=True)
+  assert sorted(copy_tree('static', 'site')) == ['a.txt', 'sub/b.txt']
+  assert read('site/sub/b.txt') == 'b'
+
+  os.link('site/a.txt', 'site/a-old.txt') # Shared with another generation.
+  assert not copy_file('static/a.txt', 'site/a.txt')
+  write('static/a.txt', 'aa')
+  assert copy_file('static/a.txt', 'site/a.txt')
+  assert read('site/a.txt') == 'aa'
+  assert read('site/a-old.txt') == 'a'
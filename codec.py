@@ -0,0 +1,40 @@
+import json
+import zlib
+from typing import Any, Dict, List
+
+class JsonCodec:
+  """ Plain JSON text, the format of the columns before there were codecs. """
+  name = 'json'
+
+  def encode(self, data: Any) -> str | bytes:
+    return json.dumps(data)
+
+class ZlibJsonCodec:
+  """ Compact JSON compressed with zlib, stored as a blob that starts with the version byte. """
+  name = 'zlib'
+  version = 1
+
+  def encode(self, data: Any) -> str | bytes:
+    text = json.dumps(data, separators=(',', ':'))
+    return bytes([self.version]) + zlib.compress(text.encode('utf-8'), 9)
+
+  def decode(self, value: bytes) -> Any:
+    return json.loads(zlib.decompress(value[1:]))
+
+ALL_CODECS: List[Any] = [JsonCodec(), ZlibJsonCodec()]
+CODECS: Dict[str, Any] = { c.name: c for c in ALL_CODECS }
+# The codecs for blobs, by their version byte.
+VERSIONS: Dict[int, Any] = { c.version: c for c in CODECS.values() if hasattr(c, 'version') }
+
+def get_codec(name: str) -> Any:
+  if name not in CODECS:
+    raise Exception(f"Unknown codec '{name}', expected one of {list(CODECS.keys())}")
+  return CODECS[name]
+
+def decode(value: str | bytes) -> Any:
+  """ Decode a column written by any of the codecs. """
+  if isinstance(value, str):
+    return json.loads(value)
+  if value[0] not in VERSIONS:
+    raise Exception(f"Unknown codec version {value[0]}")
+  return VERSIONS[value[0]].decode(value)
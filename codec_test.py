@@ -0,0 +1,22 @@
+import pytest
+from codec import *
+
+DATA = {'word': 'tofu', 'defs': [{'meaning': 'bean curd', 'example': None}]}
+
+def test_zlib_codec():
+  codec = get_codec('zlib')
+  value = codec.encode(DATA)
+  assert isinstance(value, bytes)
+  assert value[0] == codec.version
+  assert decode(value) == DATA
+
+def test_decode_plain_json():
+  value = get_codec('json').encode(DATA)
+  assert value == json.dumps(DATA)
+  assert decode(value) == DATA
+
+def test_unknown_codec():
+  with pytest.raises(Exception):
+    get_codec('lz4')
+  with pytest.raises(Exception):
+    decode(bytes([99]) + b'{}')
@@ -0,0 +1,55 @@
+import os
+import gzip
+from typing import List, Dict
+from pyutils import *
+from pyutils.settings import config
+from site_util import write_replace
+try:
+  import brotli # Optional, only needed for PRECOMPRESS_BROTLI.
+except ImportError:
+  brotli = None
+
+# Compressed copies of the generated files, nginx serves 'page.gz' instead of 'page' with gzip_static.
+SIDECARS = ['.gz', '.br']
+# The static files that are compressed, the pages are always html or xml.
+TYPES = ['.html', '.xml', '.css', '.js']
+MIN_SIZE = 1024 # Same as gzip_min_length in nginx.conf, smaller files are not worth compressing.
+
+def sidecar_types() -> List[str]:
+  """ The sidecars to write, from the config. """
+  if not config['PRECOMPRESS']:
+    return []
+  if config['PRECOMPRESS_BROTLI'] and brotli is None:
+    log_error('PRECOMPRESS_BROTLI is set, but the brotli module is not installed.')
+    config['PRECOMPRESS_BROTLI'] = False
+  return ['.gz', '.br'] if config['PRECOMPRESS_BROTLI'] else ['.gz']
+
+def compress(data: bytes) -> Dict[str, bytes]:
+  """ The sidecars of a file with `data`, by their extension. At the highest levels since they are only made once. """
+  if len(data) < MIN_SIZE:
+    return {}
+  result = {}
+  for ext in sidecar_types():
+    if ext == '.gz':
+      result[ext] = gzip.compress(data, compresslevel=9, mtime=0)
+    elif ext == '.br':
+      result[ext] = brotli.compress(data, quality=11)
+  return result
+
+def write_sidecars(path: str, sidecars: Dict[str, bytes], create_dirs: bool=True) -> None:
+  """ Write the sidecars of the file at `path` and remove the old ones that weren't made this time. """
+  for ext in SIDECARS:
+    if ext in sidecars:
+      write_replace(path + ext, sidecars[ext], create_dirs=create_dirs)
+    else:
+      rm(path + ext)
+
+def compress_file(path: str) -> None:
+  """ Make the sidecars of a static file, if it is one of the TYPES and changed since they were made. """
+  if os.path.splitext(path)[1] not in TYPES:
+    return
+  exts = sidecar_types()
+  if exts and all(exists(path + ext) and os.path.getmtime(path + ext) >= os.path.getmtime(path) for ext in exts):
+    return
+  with open(path, 'rb') as f:
+    write_sidecars(path, compress(f.read()))
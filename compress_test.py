@@ -0,0 +1,36 @@
+import gzip
+import pytest
+from pyutils import *
+from compress import *
+
+DATA = b'<html>' + b'spelling bee ' * 200 + b'</html>'
+
+def test_compress(monkeypatch):
+  monkeypatch.setitem(config, 'PRECOMPRESS', True)
+  monkeypatch.setitem(config, 'PRECOMPRESS_BROTLI', False)
+  sidecars = compress(DATA)
+  assert list(sidecars.keys()) == ['.gz']
+  assert gzip.decompress(sidecars['.gz']) == DATA
+  assert compress(b'<html></html>') == {}
+
+  monkeypatch.setitem(config, 'PRECOMPRESS', False)
+  assert compress(DATA) == {}
+
+def test_compress_file(fs, monkeypatch):
+  monkeypatch.setitem(config, 'PRECOMPRESS', True)
+  monkeypatch.setitem(config, 'PRECOMPRESS_BROTLI', False)
+  write('site/style.css', DATA, binary=True, create_dirs=True)
+  write('site/style.css.br', b'old', binary=True)
+  write('site/bee.gif', DATA, binary=True)
+
+  compress_file('site/style.css')
+  compress_file('site/bee.gif')
+
+  assert gzip.decompress(read('site/style.css.gz', binary=True)) == DATA
+  assert not exists('site/style.css.br')
+  assert not exists('site/bee.gif.gz')
+
+  # Not compressed again while the file is older than its sidecar.
+  write('site/style.css.gz', b'unchanged', binary=True)
+  compress_file('site/style.css')
+  assert read('site/style.css.gz', binary=True) == b'unchanged'
@@ -1,30 +1,63 @@
 #!/usr/bin/env python3
 import json
 import sqlite3
+import weakref
+import itertools
 import unicodedata
 import re
-import dacite
 import filecmp
 from dataclasses import dataclass, asdict, fields, field
-from typing import List, Any, Dict, Optional, Tuple
-from collections import defaultdict
+from typing import List, Any, Dict, Optional, Tuple, Iterator, Set
+from contextlib import contextmanager
+from functools import partial, cache
+from collections import defaultdict, OrderedDict
 from pyutils import *
 from storage import *
 from model import *
 from mw import *
+from sqltrace import TracedConnection, get_tracer
+from codec import get_codec, decode
+from site_util import get_clue_archive_prefix
 
 SCHEMA = 'schema.sql'
 MAPPING = {Puzzle: 'puzzles', Answer: 'answers', Clue: 'clues', Definition: 'definitions', Page: 'generated'}
+# The tables with a revision column, it is set to the revision of the DB that last changed the row.
+REVISIONED = {Puzzle, Answer, Clue, Definition}
+# Maximum number of parameters to use in one query, older versions of sqlite have a limit of 999.
+MAX_VARIABLES = 500
+# The field names of the storage classes, fields() is too slow to call for every row.
+FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
 
 class DB:
-  def __init__(self):
-    log(f"Opening SqliteDB {config['DB_FILE']}")
-    self.conn = sqlite3.connect('file:' + config['DB_FILE'], uri=True)
+  def __init__(self, profile: str='writer'):
+    """ `profile` selects the connection settings from the DB_PROFILE_* config, e.g. 'writer' or 'reader'. """
+    pragmas = DB.parse_profile(config.get(f"DB_PROFILE_{profile.upper()}", ''))
+    uri = 'file:' + config['DB_FILE']
+    mode = pragmas.pop('mode', None)
+    if mode and 'mode=' not in uri: # The db file may already set a mode, e.g. the in memory test db.
+      uri += ('&' if '?' in uri else '?') + f"mode={mode}"
+    self.read_only = mode == 'ro' or pragmas.get('query_only', '').upper() in ('1', 'ON', 'TRUE')
+    log(f"Opening SqliteDB {config['DB_FILE']} with the {profile} profile")
+    factory = sqlite3.Connection
+    if config['SQL_TRACE'] or config['DEBUG_DB']:
+      get_tracer()
+      factory = TracedConnection
+    self.conn = sqlite3.connect(uri, uri=True, factory=factory)
     # Return rows as dictionaries (column name access)
     self.conn.row_factory = sqlite3.Row
-    if config['DEBUG_DB']:
-      self.conn.set_trace_callback(lambda x:print(x))
     self.cursor = self.conn.cursor()
+    self.definitions_cache = DefinitionsCache(config['DEFS_CACHE_SIZE'])
+    self._revision: Optional[int] = None # Allocated on the first write of each transaction.
+    # How the large JSON columns are written, they can be read whatever codec wrote them.
+    self.codec = get_codec(config['DB_CODEC'])
+    for name, value in pragmas.items():
+      self.conn.execute(f"PRAGMA {name} = {value}")
+
+    if self.read_only:
+      version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+      if version != len(MIGRATIONS):
+        raise Exception(f"{config['DB_FILE']} is at version {version}, not {len(MIGRATIONS)}. Open it with a writer first.")
+      return
 
     # Create tables if they don't exist
     cursor = self.conn.execute(
@@ -32,7 +65,9 @@ class DB:
     if cursor.fetchone() is None:
       log("Creating tables...")
       self.conn.executescript(read(SCHEMA))
+      self.conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
       self.conn.commit()
+    self.migrate()
 
   def __del__(self):
     try:
@@ -43,10 +78,35 @@ class DB:
 
   def commit(self) -> None:
     self.conn.commit()
+    # The next transaction gets a new revision. A reader may have seen this one already, the rows
+    # written after it must have a higher revision to be seen as changed.
+    self._revision = None
+
+  def migrate(self) -> None:
+    """ Update a db created from an older version of schema.sql. """
+    version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+    for i in range(version, len(MIGRATIONS)):
+      migration = MIGRATIONS[i]
+      log(f"Migrating db to version {i+1}: {migration.__name__}")
+      migration(self)
+      self.conn.execute(f"PRAGMA user_version = {i+1}")
+      self.conn.commit()
+
+  @contextmanager
+  def read_transaction(self) -> Iterator[None]:
+    """ All the queries inside this block read the same version of the db. Pending writes are committed first. """
+    self.commit()
+    self.cursor.execute('BEGIN')
+    try:
+      yield
+    finally:
+      self.conn.commit()
 
   def insert(self, dataclass_instance, ignore_dups=False, replace_term='') -> int:
     data = DB.to_dict(dataclass_instance)
     table_name = MAPPING[type(dataclass_instance)]
+    if type(dataclass_instance) in REVISIONED:
+      data['revision'] = self.revision()
     columns = ', '.join(data.keys())
     placeholders = DB.placeholders(len(data))
 
@@ -69,62 +129,130 @@ class DB:
     return last_id
 
   def upsert_gpuzzle(self, p: GPuzzle) -> int:
-    puzzle = Puzzle(
+    return self.upsert_gpuzzles([p])[0]
+
+  def upsert_gpuzzles(self, gpuzzles: List[GPuzzle]) -> List[int]:
+    puzzles = [ Puzzle(
       date=p.date,
       center_letter=p.center_letter,
       outer_letters=joinl(p.outer_letters, sep=''),
       missing_answers=json.dumps(p.missing_answers),
-      hints=json.dumps([ asdict(h) for h in p.hints ]))
-    return self.upsert_puzzle(puzzle)
+      hints=self.codec.encode([ asdict(h) for h in p.hints ])) for p in gpuzzles ]
+    return self.upsert_puzzles(puzzles)
 
   def upsert_puzzle(self, puzzle: Puzzle, ignore_dups: bool=False) -> int:
-    columns = DB.to_dict(puzzle).keys() - 'id'
-    if ignore_dups:
-      replace_term = ''
-    else:
-      updates = joinl([ f"{col} = excluded.{col}" for col in columns], sep=', ')
-      replace_term = f"ON CONFLICT(date) DO UPDATE SET {updates}"
+    return self.upsert_puzzles([puzzle], ignore_dups=ignore_dups)[0]
 
-    last_id = self.insert(puzzle, ignore_dups=ignore_dups, replace_term=replace_term)
-    return self._last_inserted_or_get_id(last_id, 'puzzles', {'date': puzzle.date})
+  def upsert_puzzles(self, puzzles: List[Puzzle], ignore_dups: bool=False) -> List[int]:
+    """ Returns the ids of the puzzles, in the same order. """
+    self._upsert_all(puzzles, conflict='date', ignore_dups=ignore_dups)
+    return self._fetch_ids('puzzles', ('date',), [ (p.date,) for p in puzzles ])
 
   def upsert_answer(self, answer: Answer) -> int:
-    columns = DB.to_dict(answer).keys() - 'id'
-    updates = joinl([ f"{col} = excluded.{col}" for col in columns], sep=', ')
-    replace_term = f"ON CONFLICT(word,answers.puzzle_id) DO UPDATE SET {updates}"
+    return self.upsert_answers([answer])[0]
 
-    last_id = self.insert(answer, replace_term=replace_term)
-    return self._last_inserted_or_get_id(last_id, 'answers', {'word': answer.word, 'puzzle_id': answer.puzzle_id})
+  def upsert_answers(self, answers: List[Answer]) -> List[int]:
+    self._upsert_all(answers, conflict='word, puzzle_id')
+    return self._fetch_ids('answers', ('word', 'puzzle_id'), [ (a.word, a.puzzle_id) for a in answers ])
 
   def upsert_clue(self, clue: Clue) -> int:
-    assert clue.text and clue.url, clue
-    columns = DB.to_dict(clue).keys() - 'id'
-    updates = joinl([ f"{col} = excluded.{col}" for col in columns], sep=', ')
-    replace_term = f"ON CONFLICT(text) DO UPDATE SET {updates}"
+    return self.upsert_clues([clue])[0]
 
-    last_id = self.insert(clue, replace_term=replace_term)
-    return self._last_inserted_or_get_id(last_id, 'clues', {'text': clue.text})
+  def upsert_clues(self, clues: List[Clue]) -> List[int]:
+    for clue in clues:
+      assert clue.text and clue.url, clue
+      if not clue.archive_prefix:
+        clue.archive_prefix = get_clue_archive_prefix(clue.text)
+    self._upsert_all(clues, conflict='text')
+    return self._fetch_ids('clues', ('text',), [ (c.text,) for c in clues ])
 
   def insert_definition(self, gdefs: GDefinitions) -> None:
-    d = Definition(word=gdefs.word, definitions=json.dumps(asdict(gdefs)))
-    self.insert(d)
-
-  def _last_inserted_or_get_id(self, last_id: int, table: str, where_terms: Dict[str, int | str]) -> int:
-    if last_id:
-      return last_id
-    query = f"SELECT id FROM {table} WHERE "
-    query += joinl([ f"{col} = ?" for col in where_terms.keys()])
-    values = where_terms.values()
-    # print(query, values)
-    self.cursor.execute(query, tuple(values))
-    res = self.cursor.fetchone()
-    if res:
-      return res[0]
-    raise Exception(f"INSERT constraint failed, but could not find row in {table} with {where_terms}")
+    self.insert_definitions([gdefs])
+
+  def insert_definitions(self, gdefs_list: List[GDefinitions]) -> None:
+    self._upsert_all([ self.to_definition(gdefs) for gdefs in gdefs_list ])
+    for gdefs in gdefs_list:
+      self.definitions_cache.invalidate(gdefs.word)
+
+  def _upsert_all(self, instances: List[Any], conflict: str='', ignore_dups: bool=False) -> None:
+    """ Insert the rows with one executemany per run of rows that have the same non-None columns. """
+    revision = (self.revision(),) if instances and type(instances[0]) in REVISIONED else ()
+    for columns, group in itertools.groupby(instances, key=DB.present_columns):
+      sql = DB.insert_sql(MAPPING[type(instances[0])], columns, conflict, ignore_dups, revision=bool(revision))
+      rows = [ tuple(getattr(instance, col) for col in columns) + revision for instance in group ]
+      try:
+        self.cursor.executemany(sql, rows)
+      except sqlite3.IntegrityError as e:
+        log_error(f"Failed to import {len(rows)} rows into {MAPPING[type(instances[0])]}: {e}")
+        raise e
+
+  def _fetch_ids(self, table: str, key_columns: Tuple[str, ...], keys: List[Tuple]) -> List[int]:
+    """ The ids of the rows with the given keys, in the same order as `keys`. """
+    ids = {}
+    uniq_keys = list(dict.fromkeys(keys))
+    n = MAX_VARIABLES // len(key_columns)
+    row_placeholder = f"({DB.placeholders(len(key_columns))})"
+    for i in range(0, len(uniq_keys), n):
+      chunk = uniq_keys[i:i+n]
+      values = joinl([row_placeholder] * len(chunk), sep=',')
+      query = f"SELECT id, {', '.join(key_columns)} FROM {table} WHERE ({', '.join(key_columns)}) IN (VALUES {values})"
+      for row in self.conn.execute(query, [ v for key in chunk for v in key ]):
+        ids[tuple(row)[1:]] = row['id']
+    missing = [ key for key in uniq_keys if key not in ids ]
+    if missing:
+      raise Exception(f"INSERT constraint failed, but could not find rows in {table} with {key_columns} = {missing}")
+    return [ ids[key] for key in keys ]
+
+  def revision(self) -> int:
+    """ The revision of the rows written in this transaction, it is allocated when the first row is written. """
+    if self._revision is None:
+      self._revision = int(self.get_meta('revision', '0')) + 1
+      self.set_meta('revision', str(self._revision))
+    return self._revision
+
+  def get_revision(self) -> int:
+    """ The latest revision that was written to the db. """
+    return int(self.get_meta('revision', '0'))
+
+  def get_meta(self, key: str, default: str='') -> str:
+    row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else default
+
+  def set_meta(self, key: str, value: str) -> None:
+    self.cursor.execute("""
+      INSERT INTO meta (key, value) VALUES (?,?)
+      ON CONFLICT(key) DO UPDATE SET value = excluded.value""", (key, value))
+
+  def changed_since(self, since: int, until: Optional[int]=None) -> Changes:
+    """ The puzzle dates, clue urls and words of the rows changed after revision `since`, up to `until`. """
+    terms = "{t}revision > ?" + (" AND {t}revision <= ?" if until is not None else '')
+    params = [since] + ([until] if until is not None else [])
+    def values(query: str) -> Set[str]:
+      query = query.format(terms=terms.format(t=''), a_terms=terms.format(t='a.'))
+      return { row[0] for row in self.conn.execute(query, params * query.count('revision > ?')) }
+
+    dates = values("""
+      SELECT date FROM puzzles WHERE {terms}
+      UNION
+      SELECT p.date FROM answers a JOIN puzzles p ON a.puzzle_id = p.id WHERE {a_terms};""")
+    clue_urls = values("""
+      SELECT url FROM clues WHERE {terms}
+      UNION
+      SELECT c.url FROM answers a JOIN clues c ON a.clue_id = c.id WHERE {a_terms};""")
+    answer_words = values("SELECT word FROM answers WHERE {terms};")
+    definition_words = values("SELECT word FROM definitions WHERE {terms};")
+    return Changes(dates=dates, clue_urls=clue_urls, answer_words=answer_words, definition_words=definition_words)
+
+  def fetch_raw(self, word: str) -> List[Any]:
+    """ The raw API responses for the definitions of `word`, in the same order as GDefinitions.defs. """
+    row = self.conn.execute("SELECT raw FROM definitions WHERE word = ?", (word,)).fetchone()
+    if row is None:
+      raise Exception(f"No definitions for {word}")
+    return decode(row['raw'])
 
   def fetch(self, cls, ids: List[int]=[]):
     table_name = MAPPING[cls]
-    query = f"SELECT * FROM {table_name}"
+    query = f"SELECT {', '.join(DB.field_names(cls))} FROM {table_name}"
     if ids:
       placeholders = DB.placeholders(len(ids))
       query += f"  WHERE id IN ({placeholders})"
@@ -132,10 +260,12 @@ class DB:
     while row := self.cursor.fetchone():
       yield DB.from_dict(cls, dict(row))
 
-  def fetch_gclue_pages(self) -> List[GCluePage]:
+  def fetch_gclue_pages(self, answers: Optional[List[GAnswer]]=None) -> List[GCluePage]:
+    if answers is None:
+      answers = self.fetch_ganswers()
     # The answers grouped by url.
     by_url = defaultdict(list)
-    for answer in self.fetch_ganswers():
+    for answer in answers:
       if answer.url:
         by_url[answer.url].append(answer)
     result = []
@@ -175,28 +305,56 @@ class DB:
     return None
 
   def fetch_ganswers(self) -> List[GAnswer]:
-    # Get all answers and their clue.
-    self.cursor.execute("""
-      SELECT a.word, a.is_pangram, p.date as puzzle_date, c.text, c.url, d.definitions
+    return self._fetch_ganswers()
+
+  def _fetch_ganswers(self, puzzle_ids: Optional[List[int]]=None) -> List[GAnswer]:
+    """ The answers of all the puzzles, or only of the puzzles with `puzzle_ids`. """
+    # Get all answers and their clue. If an answer has no clue, the most recent clue
+    # for the same word is used instead (the same as `get_clue_by_word`, but for every word at once).
+    clues_where_term, where_term, params = '', '', []
+    if puzzle_ids is not None:
+      placeholders = DB.placeholders(len(puzzle_ids))
+      clues_where_term = f"WHERE a.word IN (SELECT word FROM answers WHERE puzzle_id IN ({placeholders}))"
+      where_term = f"WHERE a.puzzle_id IN ({placeholders})"
+      params = puzzle_ids + puzzle_ids
+    self.cursor.execute(f"""
+      WITH latest_clues AS (
+        SELECT a.word, c.text, c.url, c.archive_prefix,
+          ROW_NUMBER() OVER (PARTITION BY a.word ORDER BY p.date DESC) AS n
+        FROM answers a
+        JOIN clues c ON a.clue_id = c.id
+        JOIN puzzles p on a.puzzle_id = p.id
+        JOIN definitions d on a.word = d.word
+        {clues_where_term}
+      )
+      SELECT a.word, a.is_pangram, p.date as puzzle_date, c.text, c.url, c.archive_prefix,
+        lc.text AS latest_text, lc.url AS latest_url, lc.archive_prefix AS latest_archive_prefix
       FROM answers a
       LEFT JOIN clues c ON a.clue_id = c.id
       JOIN puzzles p on a.puzzle_id = p.id
-      LEFT JOIN definitions d on a.word = d.word;
-      """)
+      LEFT JOIN latest_clues lc ON a.word = lc.word AND lc.n = 1
+      {where_term};
+      """, params)
+    rows = self.cursor.fetchall()
+    # The same definitions instance is shared by all the answers for a word.
+    gdefs = self.fetch_gdefs(uniq(mapl(lambda x:x['word'], rows)))
 
     result = []
-    for row in self.cursor.fetchall():
+    for row in rows:
       data = dict(row)
       word = data['word']
       text = data['text']
       url = data['url']
-      definitions = DB.deserialize_gdefs(word, data['definitions'])
+      archive_prefix = data['archive_prefix']
+      definitions = gdefs[word]
+      latest_clue = False
       if not text:
         # Clue is not available, try to come up with one.
-        clue = self.get_clue_by_word(word)
-        if clue:
-          text = clue.text
-          url = clue.url
+        if data['latest_text']:
+          latest_clue = True
+          text = data['latest_text']
+          url = data['latest_url']
+          archive_prefix = data['latest_archive_prefix']
         else:
           text = get_clue_from_def(definitions)
           url = None # No URL for generated clues.
@@ -206,33 +364,38 @@ class DB:
         text = text,
         puzzle_date = data['puzzle_date'],
         url = url,
-        definitions = definitions)
+        definitions = definitions,
+        archive_prefix = archive_prefix or None,
+        latest_clue = latest_clue)
       result.append(answer)
     result = sorted(result)
     return result
 
-  def fetch_gwords(self) -> List[GWordDefinition]:
+  def fetch_gwords(self, answers: Optional[List[GAnswer]]=None) -> List[GWordDefinition]:
+    if answers is not None:
+      # The answers already have the definitions, don't fetch them again.
+      by_word = { answer.word: answer.definitions for answer in answers }
+      return sorted(GWordDefinition(word=word, definition=defs.deff if defs.has_def else None)
+        for word,defs in by_word.items())
+
     # Get all words and their definitions.
-    self.cursor.execute("""
-      SELECT distinct a.word, d.definitions
-      FROM answers a
-      LEFT JOIN definitions d on a.word = d.word;
-      """)
+    words = self._fetch_values("SELECT distinct word FROM answers;")
+    gdefs = self.fetch_gdefs(words)
     result = []
-    for row in self.cursor.fetchall():
-      data = dict(row)
-      word = data['word']
-      definitions = DB.deserialize_gdefs(word, data['definitions'])
+    for word in words:
+      definitions = gdefs[word]
       definition = definitions.deff if definitions.has_def else None
       answer = GWordDefinition(word=word, definition=definition)
       result.append(answer)
     result = sorted(result)
     return result
 
-  def fetch_gpuzzles(self, limit=None, where_term="") -> List[GPuzzle]:
-    # The answers group by url.
+  def fetch_gpuzzles(self, limit=None, where_term="", answers: Optional[List[GAnswer]]=None) -> List[GPuzzle]:
+    if answers is None:
+      return list(self.iter_gpuzzles(limit=limit, where_term=where_term))
+    # The answers group by date.
     by_date = defaultdict(list)
-    for answer in self.fetch_ganswers():
+    for answer in answers:
       by_date[answer.puzzle_date].append(answer)
 
     query = """
@@ -242,39 +405,104 @@ class DB:
       ORDER BY p.date DESC
       {limit_term};
     """
+    where_term = f"WHERE {where_term}" if where_term else ""
     limit_term = f"LIMIT {limit}" if limit else ""
-    # print(query.format(limit_term=limit_term, where_term=where_term))
     self.cursor.execute(query.format(limit_term=limit_term, where_term=where_term))
-    result = []
-    for row in self.cursor.fetchall():
-      # print(dict(row))
-      answers = by_date[row['date']]
-      hints = self.deserialize_hints(row['hints'])
-      puzzle = GPuzzle(
-          date=row['date'],
-          center_letter=row['center_letter'],
-          outer_letters=list(row['outer_letters']),
-          _answers=answers,
-          missing_answers=json.loads(row['missing_answers']),
-          hints=hints)
-      result.append(puzzle)
-    return result
+    return [ self._to_gpuzzle(row, by_date[row['date']]) for row in self.cursor.fetchall() ]
+
+  def iter_gpuzzles(self, since: Optional[str]=None, until: Optional[str]=None, limit: Optional[int]=None,
+      where_term: str="", batch_size: int=100) -> Iterator[GPuzzle]:
+    """
+      The puzzles from `since` to `until` (inclusive), most recent first. The puzzles are read `batch_size`
+      at a time, with only the answers for that batch, so memory use does not grow with the number of puzzles.
+    """
+    terms, params = [], []
+    if since:
+      terms.append("p.date >= ?")
+      params.append(since)
+    if until:
+      terms.append("p.date <= ?")
+      params.append(until)
+    if where_term:
+      terms.append(f"({where_term})")
+    query = """
+      SELECT *
+      FROM puzzles p
+      WHERE {terms}
+      ORDER BY p.date DESC
+      LIMIT ?;
+    """
+    batch_size = min(batch_size, MAX_VARIABLES // 2)
+    n = 0
+    last_date = None
+    while limit is None or n < limit:
+      batch_terms, batch_params = list(terms), list(params)
+      if last_date:
+        batch_terms.append("p.date < ?")
+        batch_params.append(last_date)
+      size = batch_size if limit is None else min(batch_size, limit - n)
+      rows = self.conn.execute(query.format(terms=joinl(batch_terms or ['TRUE'], sep=' AND ')),
+        batch_params + [size]).fetchall()
+      if not rows:
+        break
+      by_date = defaultdict(list)
+      for answer in self._fetch_ganswers([ row['id'] for row in rows ]):
+        by_date[answer.puzzle_date].append(answer)
+      for row in rows:
+        yield self._to_gpuzzle(row, by_date[row['date']])
+      n += len(rows)
+      last_date = rows[-1]['date']
+
+  def _to_gpuzzle(self, row: sqlite3.Row, answers: List[GAnswer]) -> GPuzzle:
+    return GPuzzle(
+      date=row['date'],
+      center_letter=row['center_letter'],
+      outer_letters=list(row['outer_letters']),
+      _answers=answers,
+      missing_answers=json.loads(row['missing_answers']),
+      hints=self.deserialize_hints(row['hints']))
 
   def fetch_puzzles_without_hints(self) -> List[GPuzzle]:
-    where_term = "WHERE hints IS ''"
-    return self.fetch_gpuzzles(where_term=where_term)
+    return self.fetch_gpuzzles(where_term="hints IS ''")
 
   def fetch_definitions(self, words: List[str]) -> Dict[str, GDefinitions]:
+    """ The definitions of the words that are in the db. """
+    result = {}
+    for word,gdefs in self._load_definitions(words).items():
+      if gdefs is not None:
+        result[word] = gdefs
+    return result
+
+  def fetch_gdefs(self, words: List[str]) -> Dict[str, GDefinitions]:
+    """ The definitions of all the words, words that are not in the db get an empty GDefinitions. """
+    result = {}
+    for word,gdefs in self._load_definitions(words).items():
+      result[word] = gdefs if gdefs is not None else GDefinitions(word=word, defs=[])
+    return result
+
+  def _load_definitions(self, words: List[str]) -> Dict[str, Optional[GDefinitions]]:
+    """ Get the definitions from the cache, the ones that are not cached are read from the db and added to it. """
+    result: Dict[str, Optional[GDefinitions]] = {}
+    missing = []
+    for word in uniq(words):
+      if word in self.definitions_cache:
+        result[word] = self.definitions_cache.get(word)
+      else:
+        missing.append(word)
     query = """
-      SELECT *
+      SELECT word, definitions
       FROM definitions
       WHERE word IN ({placeholders});"""
-    placeholders = DB.placeholders(len(words))
-    self.cursor.execute(query.format(placeholders=placeholders), words)
-    result = {}
-    for row in self.cursor.fetchall():
-      word = row['word']
-      result[word] = DB.deserialize_gdefs(word, row['definitions'])
+    for i in range(0, len(missing), MAX_VARIABLES):
+      chunk = missing[i:i+MAX_VARIABLES]
+      for word in chunk:
+        result[word] = None
+      rows = self.conn.execute(query.format(placeholders=DB.placeholders(len(chunk))), chunk).fetchall()
+      for row in rows:
+        word = row['word']
+        result[word] = self.deserialize_gdefs(word, row['definitions'])
+      for word in chunk:
+        self.definitions_cache.put(word, result[word])
     return result
 
   def fetch_undefined_words(self) -> List[str]:
@@ -313,23 +541,8 @@ class DB:
     query = "INSERT INTO imported (name) VALUES (?) ON CONFLICT(name) DO NOTHING"
     self.cursor.execute(query, (name,))
 
-  def is_generated(self, path: str, lastmod: Optional[str]=None) -> bool:
-    and_term = f"AND lastmod >= {lastmod}" if lastmod else ''
-    query = """
-      SELECT 1 FROM generated
-      WHERE path = ? AND needs_regen = FALSE {and_term}
-      LIMIT 1"""
-    self.cursor.execute(query.format(and_term=and_term), (path,))
-    return self.cursor.fetchone() is not None
-
-  def mark_as_generated(self, path: str, lastmod: str, needs_regen: bool=False) -> None:
-    query = """
-      INSERT INTO generated (path, lastmod, needs_regen)
-      VALUES (?,?,?)
-      ON CONFLICT(path) DO UPDATE
-        SET lastmod = excluded.lastmod, needs_regen = excluded.needs_regen
-    """
-    self.cursor.execute(query, (path, lastmod, needs_regen))
+  def upsert_pages(self, pages: List[Page]) -> None:
+    self._upsert_all(pages, conflict='path')
 
   def get_pages(self) -> List[Page]:
     return self.fetch(Page)
@@ -338,6 +551,17 @@ class DB:
     query = f"DELETE FROM generated"
     self.cursor.execute(query)
 
+  @staticmethod
+  def parse_profile(profile: str) -> Dict[str, str]:
+    """ Parse 'name=value;name=value' into a dict. """
+    pragmas = {}
+    for term in profile.split(';'):
+      if not term.strip():
+        continue
+      name, value = term.split('=', 1)
+      pragmas[name.strip()] = value.strip()
+    return pragmas
+
   @staticmethod
   def from_dict(cls, data: Dict):
     for f in fields(cls):
@@ -365,19 +589,78 @@ class DB:
         raise Exception(f"Cannot write {value} of type {type(value)} to DB.")
     return data
 
-  @staticmethod
-  def deserialize_gdefs(word: str, gdefs_json: str) -> GDefinitions:
+  def to_definition(self, gdefs: GDefinitions) -> Definition:
+    # The raw API responses are stored separately, they are only needed for the hints.
+    data = asdict(gdefs)
+    raw = [ d.pop('raw') for d in data['defs'] ]
+    return Definition(word=gdefs.word, definitions=self.codec.encode(data), raw=self.codec.encode(raw))
+
+  def deserialize_gdefs(self, word: str, gdefs_json: str | bytes) -> GDefinitions:
+    """ The raw API responses are not loaded until they are used. """
     if not gdefs_json:
       return GDefinitions(word=word, defs=[])
-    data = json.loads(gdefs_json)
-    return dacite.from_dict(data_class=GDefinitions, data=data)
+    data = decode(gdefs_json)
+    raws: List[Any] = []
+    # Weak reference, the cached definitions must not keep the db open.
+    db_ref = weakref.ref(self)
+    def load_raw(i: int) -> Any:
+      if not raws:
+        db = db_ref()
+        if db is None:
+          raise Exception(f"Cannot load raw definitions for {word}, the db was closed.")
+        raws.extend(db.fetch_raw(word))
+      return raws[i]
+
+    # This is done by hand rather than with dacite because it is on the hot path and dacite is slow.
+    defs = []
+    for i,d in enumerate(data['defs']):
+      word_types = [ GWordTypeDefinition(
+          word_type=wt['word_type'],
+          meanings=[ GWordMeaning(meaning=m['meaning'], example=m['example']) for m in wt['meanings'] ])
+        for wt in d['word_types'] ]
+      deff = GDefinition(
+        word=d['word'],
+        retrieved_on=d['retrieved_on'],
+        retrieved_from=d['retrieved_from'],
+        raw=None,
+        source_url=d['source_url'],
+        word_types=word_types)
+      deff.set_raw_loader(partial(load_raw, i))
+      defs.append(deff)
+    return GDefinitions(word=data['word'], defs=defs)
 
   @staticmethod
-  def deserialize_hints(hints_json: str) -> List[Hint]:
+  def deserialize_hints(hints_json: str | bytes) -> List[Hint]:
     if not hints_json:
       return []
-    data = json.loads(hints_json)
-    return [ dacite.from_dict(data_class=Hint, data=o) for o in data ]
+    data = decode(hints_json)
+    return [ Hint(score=o['score'], text=o['text'], words=o['words']) for o in data ]
+
+  @staticmethod
+  def field_names(cls: type) -> Tuple[str, ...]:
+    if cls not in FIELD_NAMES:
+      FIELD_NAMES[cls] = tuple(f.name for f in fields(cls))
+    return FIELD_NAMES[cls]
+
+  @staticmethod
+  def present_columns(dataclass_instance) -> Tuple[str, ...]:
+    """ The columns to write, 'None' fields (like 'id' for autoincrement) are left out. """
+    return tuple(name for name in DB.field_names(type(dataclass_instance)) if getattr(dataclass_instance, name) is not None)
+
+  @staticmethod
+  @cache
+  def insert_sql(table: str, columns: Tuple[str, ...], conflict: str='', ignore_dups: bool=False,
+      revision: bool=False) -> str:
+    """ With `revision`, the revision is the last parameter and it is only updated when the row changes. """
+    ignore_term = 'OR IGNORE' if ignore_dups else ''
+    all_columns = columns + ('revision',) if revision else columns
+    sql = f"INSERT {ignore_term} INTO {table}({', '.join(all_columns)}) VALUES ({DB.placeholders(len(all_columns))})"
+    if conflict and not ignore_dups:
+      columns = tuple(col for col in columns if col != 'id')
+      updates = joinl([ f"{col} = excluded.{col}" for col in all_columns if col != 'id' ], sep=', ')
+      changed = joinl([ f"{table}.{col} IS NOT excluded.{col}" for col in columns ], sep=' OR ')
+      sql += f" ON CONFLICT({conflict}) DO UPDATE SET {updates} WHERE {changed}"
+    return sql
 
   @staticmethod
   def columns(dataclass_instance) -> List[str]:
@@ -386,3 +669,102 @@ class DB:
   @staticmethod
   def placeholders(n):
     return ','.join(['?'] * n)
+
+class DefinitionsCache:
+  """
+    Identity map of word -> GDefinitions, so the definitions of a word are only deserialized once and
+    the same instance is shared by every object that uses them. A value of None means the word has no
+    row in the db. When `max_size` is not zero, the least recently used words are evicted.
+  """
+  def __init__(self, max_size: int=0):
+    self.max_size = max_size
+    self.entries: OrderedDict[str, Optional[GDefinitions]] = OrderedDict()
+
+  def __contains__(self, word: str) -> bool:
+    return word in self.entries
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+  def get(self, word: str) -> Optional[GDefinitions]:
+    if word not in self.entries:
+      return None
+    self.entries.move_to_end(word)
+    return self.entries[word]
+
+  def put(self, word: str, gdefs: Optional[GDefinitions]) -> None:
+    self.entries[word] = gdefs
+    self.entries.move_to_end(word)
+    if self.max_size and len(self.entries) > self.max_size:
+      self.entries.popitem(last=False)
+
+  def invalidate(self, word: str) -> None:
+    self.entries.pop(word, None)
+
+def split_raw_definitions(db: DB) -> None:
+  """ Move the raw API responses out of definitions.definitions into their own column. """
+  db.conn.execute("ALTER TABLE definitions ADD COLUMN raw TEXT NOT NULL DEFAULT ''")
+  rows = db.conn.execute("SELECT word, definitions FROM definitions").fetchall()
+  updates = []
+  for row in rows:
+    data = json.loads(row['definitions'])
+    raw = [ d.pop('raw', None) for d in data['defs'] ]
+    updates.append((json.dumps(data), json.dumps(raw), row['word']))
+  db.conn.executemany("UPDATE definitions SET definitions = ?, raw = ? WHERE word = ?", updates)
+
+def add_indexes(db: DB) -> None:
+  """ Add the secondary indexes. """
+  db.conn.executescript("""
+    CREATE INDEX IF NOT EXISTS answers_clue_id ON answers (clue_id);
+    CREATE INDEX IF NOT EXISTS answers_puzzle_id ON answers (puzzle_id);
+    CREATE INDEX IF NOT EXISTS clues_url ON clues (url);""")
+
+def add_revisions(db: DB) -> None:
+  """ Add the revision columns and the meta table that holds the current revision. """
+  for table in ['puzzles', 'answers', 'clues', 'definitions']:
+    add_column(db, table, 'revision', 'INTEGER NOT NULL DEFAULT 0')
+    db.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_revision ON {table} (revision)")
+  db.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+def compress_json_columns(db: DB) -> None:
+  """ Rewrite the definitions and hints with the configured codec. """
+  rows = db.conn.execute("SELECT word, definitions, raw FROM definitions").fetchall()
+  db.conn.executemany("UPDATE definitions SET definitions = ?, raw = ? WHERE word = ?",
+    [ (db.codec.encode(decode(row['definitions'])), db.codec.encode(decode(row['raw'])), row['word']) for row in rows ])
+  rows = db.conn.execute("SELECT id, hints FROM puzzles WHERE hints IS NOT ''").fetchall()
+  db.conn.executemany("UPDATE puzzles SET hints = ? WHERE id = ?",
+    [ (db.codec.encode(decode(row['hints'])), row['id']) for row in rows ])
+  # Give the space back to the file system.
+  db.conn.commit()
+  db.conn.execute("VACUUM")
+
+def add_page_hashes(db: DB) -> None:
+  add_column(db, 'generated', 'hash', 'TEXT')
+
+def add_clue_archive_prefixes(db: DB) -> None:
+  """ Store the clue archive page of each clue, so the generator doesn't work it out for every answer. """
+  add_column(db, 'clues', 'archive_prefix', "TEXT NOT NULL DEFAULT ''")
+  rows = db.conn.execute("SELECT id, text FROM clues").fetchall()
+  db.conn.executemany("UPDATE clues SET archive_prefix = ? WHERE id = ?",
+    [ (get_clue_archive_prefix(row['text']), row['id']) for row in rows ])
+
+def drop_needs_regen_index(db: DB) -> None:
+  """ Nothing looks up the pages by needs_regen, the index only made the writes to generated slower. """
+  db.conn.execute("DROP INDEX IF EXISTS generated_needs_regen")
+
+def add_column(db: DB, table: str, column: str, definition: str) -> None:
+  """ Add the column if the table doesn't have it yet. """
+  columns = [ row['name'] for row in db.conn.execute(f"PRAGMA table_info({table})") ]
+  if column not in columns:
+    db.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+# The position in the list is the version of the schema after the migration was applied.
+MIGRATIONS = [
+  split_raw_definitions,
+  add_indexes,
+  add_revisions,
+  compress_json_columns,
+  add_page_hashes,
+  add_clue_archive_prefixes,
+  drop_needs_regen_index,
+]
@@ -59,13 +59,107 @@ def test_upsert_clue(temp_db):
   clues = list(db.fetch(Clue, ids=[id_1]))
   assert clues == [clue_b]
 
+def test_upsert_puzzles_returns_ids_in_order(temp_db):
+  db = DB()
+  id_1 = db.insert(P_1)
+  puzzle_b = Puzzle(date=D1, center_letter=C1, outer_letters='xyzjkl', hints='', missing_answers='[]')
+
+  ids = db.upsert_puzzles([P_2, puzzle_b, P_2])
+
+  id_2 = ids[0]
+  assert ids == [id_2, id_1, id_2]
+  assert list(db.fetch(Puzzle)) == [set_id(puzzle_b, id_1), set_id(P_2, id_2)]
+
+def test_upsert_puzzles_ignore_dups(temp_db):
+  db = DB()
+  id_1 = db.insert(P_1)
+  puzzle_b = Puzzle(date=D1, center_letter=C1, outer_letters='xyzjkl', hints='', missing_answers='[]')
+
+  assert db.upsert_puzzles([puzzle_b], ignore_dups=True) == [id_1]
+  assert list(db.fetch(Puzzle)) == [set_id(P_1, id_1)]
+
+def test_upsert_answers_without_clue_keeps_clue(temp_db):
+  db = DB()
+  puzzle_id = db.insert(P_1)
+  [clue_id] = db.upsert_clues([CL1_A])
+  with_clue = Answer(word=W1_A, is_pangram=True, puzzle_id=puzzle_id, clue_id=clue_id)
+  without_clue = Answer(word=W1_B, is_pangram=False, puzzle_id=puzzle_id, clue_id=None)
+
+  ids = db.upsert_answers([with_clue, without_clue])
+  assert db.upsert_answers([without_clue, set_id(with_clue, None)]) == ids[::-1]
+  assert db.upsert_answers([Answer(word=W1_A, is_pangram=True, puzzle_id=puzzle_id, clue_id=None)]) == ids[:1]
+
+  assert list(db.fetch(Answer)) == [set_id(with_clue, ids[0]), set_id(without_clue, ids[1])]
+
 def test_insert_definition(temp_db):
   db = DB()
   db.insert_definition(GDEF1_A)
 
   definitions = list(db.fetch(Definition))
 
-  assert definitions == [Definition(word=W1_A, definitions=json.dumps(asdict(GDEF1_A)))]
+  gdefs = asdict(GDEF1_A)
+  raw = [ d.pop('raw') for d in gdefs['defs'] ]
+  assert definitions == [Definition(word=W1_A, definitions=db.codec.encode(gdefs), raw=db.codec.encode(raw))]
+  assert decode(definitions[0].definitions) == gdefs
+
+def test_fetch_definitions_loads_raw_lazily(temp_db):
+  db = DB()
+  db.insert_definition(GDEF1_A)
+
+  gdefs = db.fetch_definitions([W1_A])[W1_A]
+
+  assert gdefs.defs[0]._raw_loader is not None
+  assert gdefs.defs[0].raw == GDEF1_A.defs[0].raw
+  assert gdefs.defs[0]._raw_loader is None
+  assert gdefs == GDEF1_A
+
+def test_migrate_splits_raw_definitions(temp_db):
+  db = DB()
+  db.conn.executescript("""
+    DROP TABLE definitions;
+    CREATE TABLE definitions (word TEXT PRIMARY KEY, definitions TEXT NOT NULL);
+    PRAGMA user_version = 0;""")
+  db.conn.execute("INSERT INTO definitions VALUES (?, ?)", (W1_A, json.dumps(asdict(GDEF1_A))))
+
+  db.migrate()
+
+  assert list(db.fetch(Definition)) == [db.to_definition(GDEF1_A)]
+  assert db.fetch_definitions([W1_A]) == {W1_A: GDEF1_A}
+
+def test_migrate_compresses_json_columns(temp_db):
+  db = DB()
+  id_1 = db.insert(P_1)
+  hints = [ asdict(h) for h in HS_1 ]
+  db.conn.execute("UPDATE puzzles SET hints = ? WHERE id = ?", (json.dumps(hints), id_1))
+  gdefs = asdict(GDEF1_A)
+  raw = [ d.pop('raw') for d in gdefs['defs'] ]
+  db.conn.execute("INSERT INTO definitions (word, definitions, raw) VALUES (?, ?, ?)", (W1_A, json.dumps(gdefs), json.dumps(raw)))
+  db.conn.execute("PRAGMA user_version = 3")
+  db.commit()
+
+  db.migrate()
+
+  assert list(db.fetch(Definition)) == [db.to_definition(GDEF1_A)]
+  assert db.fetch_definitions([W1_A]) == {W1_A: GDEF1_A}
+  [puzzle] = db.fetch(Puzzle)
+  assert puzzle.hints == db.codec.encode(hints)
+  assert db.fetch_gpuzzles()[0].hints == HS_1
+
+def test_migrate_adds_clue_archive_prefixes(temp_db):
+  db = DB()
+  db.conn.executescript("""
+    DROP TABLE clues;
+    CREATE TABLE clues (id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL UNIQUE, url TEXT NOT NULL,
+      revision INTEGER NOT NULL DEFAULT 0);
+    PRAGMA user_version = 5;""")
+  db.conn.execute("INSERT INTO clues (text, url) VALUES (?, ?)", ('“Île', '/clue/ile'))
+  db.commit()
+
+  db.migrate()
+
+  assert list(db.fetch(Clue))[0].archive_prefix == 'i'
+  db.upsert_clue(Clue(text='123', url='/clue/123'))
+  assert list(db.fetch(Clue))[1].archive_prefix == '0-9'
 
 def test_reinsert_definition_fails(temp_db):
   db = DB()
@@ -79,6 +173,27 @@ def test_reinsert_definition_fails(temp_db):
   with pytest.raises(Exception):
     db.insert_definition(tractor_2)
 
+def test_iter_gpuzzles(temp_db):
+  db = DB()
+  id_1 = db.insert(P_1)
+  id_2 = db.insert(P_2)
+  id_3 = db.insert(Puzzle(date='2025-01-01', center_letter=C1, outer_letters='xyzjkl', hints='', missing_answers='[]'))
+  clue_id = db.insert(CL1_A)
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_1, clue_id=clue_id))
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_2, clue_id=None))
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_3, clue_id=None))
+  db.insert_definition(GDEF1_A)
+
+  puzzles = list(db.iter_gpuzzles(batch_size=1))
+
+  assert puzzles == db.fetch_gpuzzles(answers=db.fetch_ganswers())
+  assert [ p.date for p in puzzles ] == ['2025-01-01', D2, D1]
+  # The answers without a clue use the latest clue, even when it is for a puzzle outside of the batch.
+  assert [ a.text for p in puzzles for a in p.answers ] == [T1_A] * 3
+  assert [ p.date for p in db.iter_gpuzzles(since=D2) ] == ['2025-01-01', D2]
+  assert [ p.date for p in db.iter_gpuzzles(until=D2, batch_size=1) ] == [D2, D1]
+  assert [ p.date for p in db.iter_gpuzzles(limit=2, batch_size=1) ] == ['2025-01-01', D2]
+
 def test_fetch_undefined(temp_db):
   db = DB()
   db.insert(P_1)
@@ -92,3 +207,116 @@ def test_fetch_undefined(temp_db):
   assert undefined == sorted([W1_B, W1_C])
 
 
+
+def test_fetch_ganswers_uses_latest_clue_for_word(temp_db):
+  db = DB()
+  id_1 = db.insert(P_1)
+  id_2 = db.insert(P_2)
+  clue_id = db.insert(CL1_A)
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_1, clue_id=clue_id))
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_2, clue_id=None))
+  db.insert(Answer(word=W1_B, is_pangram=False, puzzle_id=id_2, clue_id=None))
+  db.insert_definition(GDEF1_A)
+
+  answers = db.fetch_ganswers()
+
+  assert [(a.word, a.puzzle_date, a.text, a.url) for a in answers] == [
+    (W1_A, D2, T1_A, U1_A),
+    (W1_A, D1, T1_A, U1_A),
+    (W1_B, D2, None, None)]
+  assert db.get_clue_by_word(W1_A) == Clue(text=T1_A, url=U1_A)
+
+def test_definitions_are_shared(temp_db):
+  db = DB()
+  id_1 = db.insert(P_1)
+  id_2 = db.insert(P_2)
+  clue_id = db.insert(CL1_A)
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_1, clue_id=clue_id))
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_2, clue_id=clue_id))
+  db.insert_definition(GDEF1_A)
+
+  answers = db.fetch_ganswers()
+  words = db.fetch_gwords()
+
+  assert answers[0].definitions is answers[1].definitions
+  assert words[0].definition is answers[0].definitions.deff
+  assert db.fetch_definitions([W1_A])[W1_A] is answers[0].definitions
+
+def test_definitions_cache_evicts_least_recently_used():
+  cache = DefinitionsCache(max_size=2)
+  defs = { w: GDefinitions(word=w, defs=[]) for w in [W1_A, W1_B, W1_C] }
+  cache.put(W1_A, defs[W1_A])
+  cache.put(W1_B, defs[W1_B])
+  assert cache.get(W1_A) is defs[W1_A]
+  cache.put(W1_C, defs[W1_C])
+
+  assert W1_B not in cache
+  assert cache.get(W1_A) is defs[W1_A]
+  assert cache.get(W1_C) is defs[W1_C]
+
+def test_insert_definition_invalidates_cache(temp_db):
+  db = DB()
+  assert db.fetch_definitions([W1_A]) == {}
+  assert db.fetch_gdefs([W1_A]) == {W1_A: GDefinitions(word=W1_A, defs=[])}
+
+  db.insert_definition(GDEF1_A)
+
+  assert db.fetch_definitions([W1_A]) == {W1_A: GDEF1_A}
+
+def test_parse_profile():
+  assert DB.parse_profile('') == {}
+  assert DB.parse_profile('journal_mode=WAL; busy_timeout=100;') == {'journal_mode': 'WAL', 'busy_timeout': '100'}
+
+def test_reader_profile_is_read_only(temp_db, monkeypatch):
+  monkeypatch.setitem(config, 'DB_PROFILE_READER', 'mode=ro;query_only=ON;cache_size=-1000')
+  db = DB('writer')
+  db.insert(P_1)
+  db.commit()
+
+  reader = DB('reader')
+
+  assert reader.read_only
+  assert reader.conn.execute("PRAGMA cache_size").fetchone()[0] == -1000
+  assert [ p.date for p in reader.fetch_gpuzzles() ] == [D1]
+  with pytest.raises(sqlite3.OperationalError):
+    reader.insert(P_2)
+
+def test_changed_since(temp_db):
+  db = DB()
+  [puzzle_id] = db.upsert_puzzles([P_1])
+  [clue_id] = db.upsert_clues([CL1_A])
+  answer = Answer(word=W1_A, is_pangram=True, puzzle_id=puzzle_id, clue_id=clue_id)
+  db.upsert_answers([answer])
+  db.commit()
+  assert db.get_revision() == 1
+  first = Changes(dates={D1}, clue_urls={U1_A}, answer_words={W1_A}, definition_words=set())
+  assert db.changed_since(0) == first
+
+  db_2 = DB()
+  # Rewriting the same rows doesn't change them.
+  db_2.upsert_puzzles([P_1])
+  db_2.upsert_clues([CL1_A])
+  db_2.upsert_answers([answer])
+  assert db_2.changed_since(1) == Changes(dates=set(), clue_urls=set(), answer_words=set(), definition_words=set())
+
+  db_2.upsert_puzzles([P_2])
+  db_2.insert_definitions([GDefinitions(word=W1_B, defs=[])])
+  db_2.commit()
+  assert db_2.get_revision() == 2
+  assert db_2.changed_since(1) == Changes(dates={D2}, clue_urls=set(), answer_words=set(), definition_words={W1_B})
+  assert db_2.changed_since(0, until=1) == first
+
+def test_each_commit_has_a_new_revision(temp_db):
+  db = DB()
+  db.upsert_puzzles([P_1])
+  db.commit()
+  # A generator run between the commits of the importer.
+  reader = DB('reader')
+  generated_revision = reader.get_revision()
+  assert reader.changed_since(0).dates == {D1}
+
+  db.upsert_puzzles([P_2])
+  db.commit()
+
+  assert reader.changed_since(generated_revision).dates == {D2}
+  assert db.get_revision() == generated_revision + 1
@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 import mw
+from functools import cache
 from typing import List, Any, Dict, Optional, Set
 from pyutils import *
 from pyutils.settings import config
 from model import *
 from requester import *
 
-MW_API = 'https://dictionaryapi.com/api/v3/references/collegiate/json/{word}?key=' + read_value(config['MW_API_KEY_FILE'])
+MW_API = 'https://dictionaryapi.com/api/v3/references/collegiate/json/{word}?key={mw_api_key}'
 WIKTIONARY_API = 'https://api.dictionaryapi.dev/api/v2/entries/en/{word}'
 DICT_APIS = [MW_API, WIKTIONARY_API]
 
+@cache
+def mw_api_key() -> str:
+  """ Read when the first word is looked up, so that the module can be imported without the secrets. """
+  return read_value(config['MW_API_KEY_FILE'])
+
 class Dicts:
   def __init__(self):
     self.requester = Requester(sleep=0.5)
@@ -62,7 +68,7 @@ class Dicts:
           td.meanings.append(GWordMeaning(meaning = d['definition'], example = d.get('example',None)))
 
   def _retrieve_from_dict_api(self, word: str, url_fmt: str) -> GDefinition:
-    url = url_fmt.format(word=word)
+    url = url_fmt.format(word=word, mw_api_key=mw_api_key())
     response = self.requester.get(url)
     date = datetime.datetime.now().strftime('%Y-%m-%d')
     raw = response.json() if response else []
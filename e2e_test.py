@@ -246,7 +246,11 @@ def test_internal_pages():
 
 def test_sitemap():
   response = get('/sitemap.xml')
-  assert '/definition/' not in response.text
+  assert_contains(response, '/sitemap-clues-1.xml')
+  for section in ['puzzles', 'clues', 'archives', 'pages']:
+    response = get(f'/sitemap-{section}-1.xml')
+    assert_contains(response, '<urlset')
+    assert '/definition/' not in response.text
 
 ####### Test internal pages
 
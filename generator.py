@@ -1,54 +1,163 @@
 #!/usr/bin/env python3
 
-import unicodedata
 import re
 import os
+import json
+import time
 import datetime
-import htmlmin
+import sys
+import argparse
+import multiprocessing
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from http import HTTPStatus
 from jinja2 import Environment, FileSystemLoader, StrictUndefined
-from typing import List, Any, Dict, Optional
+from typing import List, Any, Dict, Optional, Set, Tuple
 from pyutils.settings import config
 from pyutils import *
 from site_util import *
 from model import *
 from db import *
+from snapshot import Snapshot
+from ledger import Ledger
+from minify import minify_html
+from compress import compress, compress_file, sidecar_types, SIDECARS
+from manifest import Manifest, manifest_file
+from profile_report import Profiler
+from writer import Writer
+from assets import build_css, build_js, copy_file, copy_tree, CSS, JS
+from sitemap import SectionWriter, get_section, section_hashes, render_index, SECTIONS, INDEX
 
 class Generator:
   def __init__(self):
-    self.db = DB()
-
-    self.env = Environment(
-      loader=FileSystemLoader('templates'),
-      undefined=StrictUndefined,
-      trim_blocks=(not config['DEV']),
-      lstrip_blocks=(not config['DEV']))
-    set_env_globals(self.env)
+    self.db = DB('writer')
+    # The pages are read from a separate read only connection, so the importer can write at the same time.
+    self.reader = DB('reader')
+    self.ledger = Ledger(self.db)
+    self.data = None # The snapshot of the db, loaded by generate_all.
+    self.changes = None # What changed in the db since the last run.
+    self.affected = None # The pages that depend on the changes, None if all the pages are regenerated.
+    self.written = 0
+    self.unchanged = 0 # Pages that were rendered the same as the last run.
+    self.linked = 0 # Unchanged pages that were hard linked from the previous generation.
+    # The pages of the generation that is being served, a FULL run links the unchanged ones into the new one.
+    self.previous = {} # Path -> Page.
+    self.previous_dir = None
+    self.previous_manifest = None
+
+    self.env = make_env()
+    self.pool = None # The worker processes, started by the first render_pages that uses it.
+    self.profiler = Profiler()
+    self.writer = Writer(config['WRITE_THREADS'], config['WRITE_QUEUE'])
 
     if config['FULL']:
-      self.db.clear_generated()
       new_dir = f"sbb-{datetime.datetime.now().strftime('%Y-%m-%d-%H-%M')}"
       self.out_dir = joinp(config['SITE_DIR'], new_dir)
+      # Not if it is the same dir, when FULL is run twice in the same minute.
+      if exists(config['SERVING_DEST']) and os.path.realpath(config['SERVING_DEST']) != os.path.realpath(self.out_dir):
+        self.previous = dict(self.ledger.pages)
+        self.previous_dir = os.path.realpath(config['SERVING_DEST'])
+        self.previous_manifest = load_manifest(self.previous_dir)
+      self.ledger.clear()
+      self.manifest = Manifest()
     else:
       self.out_dir = joinp(config['SITE_DIR'], 'current')
+      # Update the manifest of the generation that is written to.
+      self.manifest = load_manifest(self.out_dir)
     mkdir(self.out_dir)
 
   def generate_all(self) -> None:
     log(f"Generating to: '{self.out_dir}' {'**FULL**' if config['FULL'] else ''}")
     log(f"Config:\n{dictl(config)}")
 
-    self.generate_css() # This must happen first.
-    self.generate_main()
-    self.generate_clue_pages()
-    self.generate_clue_archives()
-    self.generate_puzzle_archives()
-    self.generate_puzzle_pages()
-    self.generate_definitions()
-    self.generate_sitemap()
-    self.generate_static()
+    with self.profiler.stage('css'):
+      self.generate_css() # This must happen first.
+    with self.profiler.stage('load'):
+      # All the stages share the same data, read once from the db.
+      self.db.commit()
+      self.data = Snapshot.load(self.reader)
+      last_revision = int(self.db.get_meta('generated_revision', '0'))
+      self.changes = self.reader.changed_since(last_revision, self.data.revision)
+      log(f'Changed since revision {last_revision}: {len(self.changes.dates):,} puzzles, '
+        f'{len(self.changes.clue_urls):,} clue pages, {len(self.changes.answer_words):,} answer words, '
+        f'{len(self.changes.definition_words):,} definitions.')
+      render_hash = get_render_hash()
+      if config['FULL'] or not last_revision:
+        log('Generating all pages.')
+      elif render_hash != self.db.get_meta('render_hash'):
+        log('Templates, config or code changed since the last run, generating all pages.')
+      else:
+        self.affected = self.find_affected()
+        log(f'{len(self.affected):,} pages depend on the changes.')
+    stages = [
+      ('main', self.generate_main),
+      ('clue_pages', self.generate_clue_pages),
+      ('clue_archives', self.generate_clue_archives),
+      ('puzzle_archives', self.generate_puzzle_archives),
+      ('puzzle_pages', self.generate_puzzle_pages),
+      ('definitions', self.generate_definitions),
+      ('sitemap', self.generate_sitemap),
+      ('static', self.generate_static),
+    ]
+    for name, generate in stages:
+      with self.profiler.stage(name):
+        generate()
+
+    with self.profiler.stage('finish'):
+      if self.pool:
+        self.pool.shutdown()
+      self.writer.close()
+      log(f'Wrote {self.written:,} files, {self.unchanged:,} were unchanged, '
+        f'{self.linked:,} were linked from the previous generation.')
+      self.manifest.save(manifest_file(self.out_dir))
+      self.switch_to_serving()
+      self.db.set_meta('generated_revision', str(self.data.revision))
+      self.db.set_meta('render_hash', render_hash)
+      self.ledger.flush()
+    self.profiler.report(revision=self.data.revision, full=config['FULL'], jobs=config['GEN_JOBS'],
+      affected=None if self.affected is None else len(self.affected))
+
+  def find_affected(self) -> Set[str]:
+    """
+      The urls of the pages that show the rows that changed since the last run: the puzzle pages of the
+      changed puzzles and the pages that link to them, the clue pages of the changed clues and their
+      month and clue archive pages (via the urls of the puzzles and clues in them) and the definition pages
+      of the changed definitions. A changed definition also changes the puzzle and clue pages of its word.
+      A changed answer only changes its own puzzle and clue, unless its clue is the new latest clue of the
+      word: the older answers without a clue show it instead of the previous one.
+    """
+    changes = self.changes
+    dates = set(changes.dates)
+    clue_urls = set(changes.clue_urls)
+    older = defaultdict(list) # The answers of the changed answer words in the other puzzles.
+    for answer in self.data.answers:
+      if answer.word in changes.definition_words:
+        dates.add(answer.puzzle_date)
+        if answer.url:
+          clue_urls.add(answer.url)
+      elif answer.word in changes.answer_words and answer.puzzle_date not in changes.dates:
+        older[answer.word].append(answer)
+    for answers in older.values():
+      # Most recent first, like the latest clue.
+      previous = next((a.url for a in answers if not a.latest_clue and a.url), None)
+      without_clue = [ a for a in answers if a.latest_clue ]
+      if without_clue and without_clue[0].url != previous:
+        dates.update(a.puzzle_date for a in without_clue)
+        clue_urls.update(filter(None, [previous, without_clue[0].url]))
+
+    affected = clue_urls | { url_for(GWordDefinition(word, None)) for word in changes.definition_words }
+    puzzles = self.data.puzzles
+    for i, puzzle in enumerate(puzzles):
+      if puzzle.date in dates:
+        # The next and previous puzzles link to this one.
+        affected.update(url_for(p) for p in puzzles[max(i-1, 0):i+2])
+    return affected
 
-    self.switch_to_serving()
+  def needs_gen(self, url: str, lastmod: Optional[str]=None) -> bool:
+    """ If the page depends on the changes or is not up to date in the ledger. """
+    if self.affected is None or url in self.affected:
+      return True
+    return not self.ledger.is_generated(url, lastmod=lastmod)
 
   def switch_to_serving(self) -> None:
     if config['FULL']:
@@ -58,40 +167,121 @@ class Generator:
       self.rel_ln(self.out_dir, config['SERVING_DEST'])
 
       s = config['SITE_DIR']
-      dirs = ls(f'{s}/sbb-*')
+      # Only the generation dirs, not their manifests.
+      dirs = filterl(lambda d:os.path.isdir(d) and not os.path.islink(d), ls(f'{s}/sbb-*'))
       dirs = sorted(dirs, reverse=True)
       for d in dirs[6:]: # keep last six generations
         log(f"Removing old generated site {d}")
         rm_rf(d)
+        rm(manifest_file(d))
 
   def output(self, location: str, contents: str, lastmod: Optional[str],
       is_internal: bool=False, needs_regen: bool=False) -> None:
-    if not config['DEV'] and config['HTML_MIN']: # Only in prod and when enable because this is slow.
-      if contents.startswith('<!DOCTYPE html>') or contents.startswith('<html>'):
-        contents = htmlmin.minify(contents,
-          remove_comments=True,        # Remove all HTML comments
-          remove_empty_space=True,     # Collapse unnecessary whitespace
-          remove_all_empty_space=False,  # Preserve essential spaces in inline elements
-          reduce_boolean_attributes=False,  # Keep `checked="checked"` for compatibility
-          remove_optional_attribute_quotes=False)  # Keep quotes around attributes for safety
-    path = joinp(self.out_dir, location)
-    write(path, contents, create_dirs = True)
+    old_hash = None if is_internal else self.get_old_hash(location)
+    self.save(location, finish_page(contents, old_hash), lastmod, is_internal, needs_regen)
+
+  def get_old_hash(self, location: str) -> Optional[str]:
+    """ The hash of the page from the last run, if its file is still there. """
+    page = self.ledger.get(page_path(location))
+    if page and self.writer.exists(joinp(self.out_dir, location)):
+      return page.hash
+    page = self.previous.get(page_path(location))
+    if page and self.previous_dir and exists(joinp(self.previous_dir, location)):
+      return page.hash
+    return None
+
+  def save(self, location: str, rendered: 'RenderedPage', lastmod: Optional[str],
+      is_internal: bool=False, needs_regen: bool=False) -> None:
+    path = page_path(location)
+    page = self.ledger.get(path)
+    if rendered.contents is None and not page:
+      # The same as in the previous generation, share its file instead of writing a copy.
+      page = self.previous[path]
+      self.link_previous(location)
+      self.ledger.mark_as_generated(path, page.lastmod, needs_regen, rendered.hash)
+      self.linked += 1
+      self.profiler.add(pages=1, **rendered.times)
+      return
+    if rendered.contents is None and page:
+      # Don't rewrite the file or change the lastmod, so caches stay valid.
+      if page.needs_regen != needs_regen:
+        self.ledger.mark_as_generated(path, page.lastmod, needs_regen, rendered.hash)
+      self.unchanged += 1
+      self.profiler.add(pages=1, **rendered.times)
+      log_debug(f"Unchanged {url(location)}")
+      return
+
+    assert rendered.contents is not None, location
+    file_path = joinp(self.out_dir, location)
+    data = rendered.contents.encode('utf-8')
+    write_secs = self.writer.write(file_path, data, rendered.sidecars)
+    self.profiler.add(pages=1, written=1, bytes=len(data), write_secs=write_secs, **rendered.times)
+    self.manifest.add(location, data)
+    for ext in SIDECARS:
+      if ext in rendered.sidecars:
+        self.manifest.add(location + ext, rendered.sidecars[ext])
+      else:
+        self.manifest.remove(location + ext)
+    self.written += 1
     if not is_internal:
       # Add to site map
-      if location == '/index.html':
-        location = '/'
-      self.db.mark_as_generated(location, lastmod, needs_regen)
+      self.ledger.mark_as_generated(path, lastmod, needs_regen, rendered.hash)
     log_debug(f"Generated {url(location)}")
 
+  def render_pages(self, jobs: List['PageJob']) -> None:
+    """ Render the pages and save them. With more than one GEN_JOBS, they are rendered in worker processes. """
+    for job in jobs:
+      job.old_hash = self.get_old_hash(job.location)
+    n_jobs = config['GEN_JOBS'] or os.cpu_count() or 1
+    # The raw definitions are not sent to the workers, DEBUG_DICT needs them.
+    if n_jobs == 1 or len(jobs) < 2 or config['DEBUG_DICT']:
+      results: Any = map(lambda job:render_job(job, self.env), jobs)
+    else:
+      if self.pool is None:
+        log(f'Rendering with {n_jobs} processes.')
+        # Not forked: the writer threads are running and a fork could copy a lock that one of them holds.
+        self.pool = ProcessPoolExecutor(n_jobs, mp_context=multiprocessing.get_context('forkserver'),
+          initializer=init_worker, initargs=(dict(config),))
+      # Bigger chunks pickle the objects that are shared by the pages, like the definitions, fewer times.
+      chunksize = max(1, ceil(len(jobs) / (n_jobs * 4)))
+      results = self.pool.map(render_job, jobs, chunksize=chunksize)
+    for job, rendered in zip(jobs, results):
+      self.save(job.location, rendered, job.lastmod, needs_regen=job.needs_regen)
+
+  def link_previous(self, location: str) -> None:
+    """ Hard link the file of the page and its sidecars from the previous generation. """
+    src_path = joinp(self.previous_dir, location)
+    dst_path = joinp(self.out_dir, location)
+    mkdir(os.path.dirname(dst_path))
+    for ext in [''] + SIDECARS:
+      if exists(src_path + ext):
+        os.link(src_path + ext, dst_path + ext)
+        path = (location + ext).lstrip('/')
+        if path in self.previous_manifest.files:
+          self.manifest.files[path] = self.previous_manifest.files[path]
+        else:
+          self.manifest.add_file(self.out_dir, path)
+    log_debug(f"Linked {url(location)}")
+
   def ln(self, src: str, dst: str, lastmod: str, is_internal: bool=False) -> None:
     log(f"Linking {src} -> {dst} lastmod:{lastmod}")
+    self.writer.wait() # For the sidecars of `src`.
     src_path = joinp(self.out_dir, src)
     dst_path = joinp(self.out_dir, dst)
 
     self.rel_ln(src_path, dst_path)
+    # The compressed sidecars need the same link, so gzip_static finds them.
+    self.manifest.add_file(self.out_dir, dst)
+    for ext in SIDECARS:
+      if exists(src_path + ext):
+        self.rel_ln(src_path + ext, dst_path + ext)
+        self.manifest.add_file(self.out_dir, dst + ext)
+      else:
+        rm(dst_path + ext)
+        self.manifest.remove(dst + ext)
 
     if not is_internal:
-      self.db.mark_as_generated(dst, lastmod)
+      self.ledger.mark_as_generated(dst, lastmod)
     log(f"Generated {url(dst)}")
 
   def rel_ln(self, src_path: str, dst_path: str) -> None:
@@ -103,34 +293,31 @@ class Generator:
     assert src_path.startswith(base_output)
     assert dst_path.startswith(base_output)
 
-    common_dir = os.path.commonpath([src_path, dst_path])
-    rel_src_path = src_path[len(common_dir)+1:]
-    rel_dst_path = dst_path[len(common_dir)+1:]
-
-    saved_dir = os.getcwd()
-    os.chdir(common_dir)
-    log_debug(f"Linking relative {rel_src_path} -> {rel_dst_path} in {common_dir}.")
-    ln(rel_src_path, rel_dst_path)
-    os.chdir(saved_dir)
+    # The link is relative to the directory it is in.
+    rel_src_path = os.path.relpath(src_path, os.path.dirname(dst_path))
+    log_debug(f"Linking relative {rel_src_path} -> {dst_path}.")
+    ln(rel_src_path, dst_path)
 
   def generate_puzzle_pages(self) -> None:
     min_mod = '2025-02-18' # when puzzle template changed.
-    template = self.env.get_template('puzzle.html')
-    puzzles = self.db.fetch_gpuzzles()
+    puzzles = self.data.puzzles
     max_date = puzzles[0].date
     min_date = puzzles[-1].date
 
     # needs_gen = filterl(lambda p:not self.db.is_generated(url_for(p)), puzzles) + puzzles[-3:]
-    c = 0
+    jobs = []
     for i, puzzle in enumerate(puzzles):
       url = url_for(puzzle)
+      lastmod = max(puzzle.date, min_mod)
+      if not self.needs_gen(url, lastmod):
+        continue
       next_ = None
       if i > 0:
         next_ = puzzles[i-1]
       prev = None
       if i < len(puzzles) - 1:
         prev = puzzles[i+1]
-      rendered = template.render(url=url,
+      context = dict(url=url,
         canon_url=url_for(puzzle),
         puzzle=puzzle,
         next_=next_,
@@ -138,30 +325,25 @@ class Generator:
         min_date=min_date,
         max_date=max_date)
       needs_regen = (not puzzle.has_all_clues())
-      self.output(url, rendered, max(puzzle.date, min_mod), needs_regen=needs_regen)
-      c += 1
+      jobs.append(PageJob(url, 'puzzle.html', context, lastmod, needs_regen=needs_regen))
+    self.render_pages(jobs)
     latest = puzzles[0]
-    log(f'Generated {c:,} puzzle pages.')
+    log(f'Generated {len(jobs):,} puzzle pages.')
     self.ln(url_for(latest), '/puzzle/latest', latest.date)
 
   def generate_clue_pages(self) -> None:
-    template = self.env.get_template('clue_page.html')
-    clue_pages = self.db.fetch_gclue_pages()
-
-    def is_generated(page: GCluePage) -> bool:
-      return not self.db.is_generated(page.url, lastmod=page.lastmod)
-    clue_pages = filter(is_generated, clue_pages)
-    c = 0
-    for page in clue_pages:
+    clue_pages = self.data.clue_pages
+
+    jobs = []
+    for page in filter(lambda p:self.needs_gen(p.url, p.lastmod), clue_pages):
       url = page.url
-      rendered = template.render(url=url, canon_url=url, page=page)
-      self.output(url, rendered, page.lastmod)
-      c +=1
-    log(f'Generated {c:,} clue pages.')
+      jobs.append(PageJob(url, 'clue_page.html', dict(url=url, canon_url=url, page=page), page.lastmod))
+    self.render_pages(jobs)
+    log(f'Generated {len(jobs):,} clue pages.')
 
   def generate_main(self) -> None:
     template = self.env.get_template('index.html')
-    puzzles = self.db.fetch_gpuzzles()
+    puzzles = self.data.puzzles
     if not puzzles:
       raise log_fatal(f'There are no puzzles in the db, run importer.py')
     latest = puzzles[0]
@@ -177,6 +359,8 @@ class Generator:
       min_date=min_date)
     today = datetime.datetime.now().strftime('%Y-%m-%d')
     self.output('/index.html', rendered, today)
+    # The older puzzle pages are not regenerated for a new puzzle, their date picker reads the range from here.
+    self.output(PUZZLE_DATES, json.dumps(dict(min=min_date, max=max_date)), None, is_internal=True)
 
     template = self.env.get_template('about.html')
     url = '/about'
@@ -197,30 +381,15 @@ class Generator:
 
   @staticmethod
   def get_clue_archive_prefix(text: str) -> str:
-    text = re.sub('^[\'"“”‘ ]+', '', text) # Remove quotes and whitespace.
-    # Try to normalize unicode to ascii, fall back to original character.
-    cs = []
-    for c in text:
-      c2 = unicodedata.normalize('NFKD', c).encode('ascii', 'ignore').decode('ascii') or c
-      cs.append(c2)
-    text = ''.join(cs)
-    text = text.lower() # URLs use lowercase, uppercase is only used for display.
-
-    prefix = text[0:1]
-    if prefix.isalpha() and prefix.isascii():
-      return prefix
-    if prefix.isdigit():
-      return '0-9'
-    else:
-      return 'symbols'
+    return get_clue_archive_prefix(text)
 
   def generate_clue_archives(self, n_per_page=50) -> None:
-    all_answers = self.db.fetch_ganswers()
+    all_answers = self.data.answers
     all_answers = filter(lambda x:x.text and x.url, all_answers) # remove answers without clues.
     by_prefix = defaultdict(list)
     for answer in all_answers:
-      prefix = Generator.get_clue_archive_prefix(answer.text)
-      by_prefix[prefix].append(answer)
+      # The prefix is stored with the clue by the importer.
+      by_prefix[answer.archive_prefix or get_clue_archive_prefix(answer.text)].append(answer)
 
     # How the prefixes are sorted, letters, then numbers, then rest.
     def prefix_key(prefix):
@@ -233,54 +402,61 @@ class Generator:
 
     prefixes = sorted(by_prefix.keys(), key=prefix_key)
     pages = mapl(lambda p:url_for('clues', p, 1), prefixes)
+    # Every page links to all the prefixes, so they all change when there is a new one.
+    new_prefix = any(map(self.needs_gen, pages))
 
-    template = self.env.get_template('clue_archive.html')
-    for prefix, answers in sorted(by_prefix.items(), key=lambda x:prefix_key(x[0])):
+    jobs = []
+    for prefix in prefixes:
+      answers = by_prefix[prefix]
       # All entries with the same clue text get one item in the list.
       by_text = defaultdict(list)
       for answer in answers:
         by_text[answer.text].append(answer)
-      # Create all the items
+      n_pages = ceil(len(by_text) / n_per_page)
+      sub_pages = mapl(lambda n:url_for('clues', prefix, n), range(1, n_pages+1))
+
+      # Only the prefixes that have new or changed clues are rebuilt.
+      changed = self.affected is None or any(map(lambda a:a.url in self.affected, answers))
+      if not (new_prefix or changed or any(map(self.needs_gen, sub_pages))):
+        continue
       items = []
       for anss in by_text.values():
-        text = anss[0].text
-        url = anss[0].url
         dates = sorted(map(lambda x:x.puzzle_date, anss), reverse=True)
-        items.append(ClueArchiveItem(text=text, url=url, dates=dates))
-
+        items.append(ClueArchiveItem(text=anss[0].text, url=anss[0].url, dates=dates))
       items = sorted(items)
-      n_pages = ceil(len(items) / n_per_page)
-      sub_pages = mapl(lambda n:url_for('clues', prefix, n), range(1, n_pages+1))
 
-      lastmod = max(map(lambda x:x.puzzle_date, answers)) # Use same lastmod for all pages even though some may not change.
-      # print(prefix, items)
+      # A new clue changes its page and moves the clues after it to the next pages. So the lastmod of
+      # a page is the most recent date of its clues and of the clues on the pages before it.
+      lastmod = ''
       for i in range(n_pages):
         page_items = items[i*n_per_page:(i+1)*n_per_page]
+        lastmod = max([lastmod] + [ item.dates[0] for item in page_items ])
         url = url_for('clues', prefix, i+1)
-        rendered = template.render(
+        context = dict(
           url=url,
           items=page_items,
           prefix=prefix,
           alphabet=prefixes,
           pagination=PaginateList(pages=sub_pages, current=url),
           canon_url=url)
-        self.output(url, rendered, lastmod)
+        jobs.append(PageJob(url, 'clue_archive.html', context, lastmod))
+    self.render_pages(jobs)
 
     template = self.env.get_template('clue_archive_index.html')
     url = '/clues/index.html'
-    prefix_counts = [ Prefix(prefix=k,count=len(v)) for k,v in sorted(by_prefix.items(), key=lambda x: prefix_key(x[0])) ]
+    prefix_counts = [ Prefix(prefix=prefix, count=len(by_prefix[prefix])) for prefix in prefixes ]
     log('Clue pages: ' + joinl(map(lambda x: f'{x.prefix.upper()}: {ceil(x.count/n_per_page)}', prefix_counts), sep=', '))
     rendered = template.render(
       url=url,
       canon_url=url,
       prefixes=prefix_counts,
       lastmod='2025-02-26')
-    self.output(url, rendered, lastmod)
+    self.output(url, rendered, max(answer.puzzle_date for answers in by_prefix.values() for answer in answers))
 
   def generate_puzzle_archives(self) -> None:
     # Group puzzles by year and month
     by_yearmonth = defaultdict(list)
-    for puzzle in self.db.fetch_gpuzzles():
+    for puzzle in self.data.puzzles:
       yearmonth = puzzle.date.rsplit('-', 1)[0]
       by_yearmonth[yearmonth].append(puzzle)
 
@@ -288,11 +464,16 @@ class Generator:
     pages = mapl(url_for, by_yearmonth.keys())
     pages = sorted(pages, reverse=True)
 
+    # Every page links to all the months, so they all change when there is a new one.
+    new_month = any(map(self.needs_gen, pages))
+
     template = self.env.get_template('puzzle_archive.html')
     for yearmonth, puzzles in by_yearmonth.items():
+      url = url_for(yearmonth)
+      if not new_month and not any(map(lambda p:p.date in self.changes.dates, puzzles)) and not self.needs_gen(url):
+        continue
       puzzles = sorted(puzzles, reverse=True)
       period = format_yearmonth(yearmonth)
-      url = url_for(yearmonth)
       lastmod = max(map(lambda x:x.date, puzzles))
       rendered = template.render(
         url=url,
@@ -309,55 +490,110 @@ class Generator:
     self.ln(latest_path, '/puzzles/latest', lastmod)
 
   def generate_definitions(self) -> None:
-    words = self.db.fetch_gwords()
-    words = filter(lambda w:not self.db.is_generated(url_for(w)), words)
-    template = self.env.get_template('word_definition.html')
+    words = self.data.words
+    words = filter(lambda w:self.needs_gen(url_for(w)), words)
     lastmod = "2025-01-01" # Just used a fixed date, these pages not indexed so it doesnt matter.
-    c = 0
+    jobs = []
     for word in words:
       url = url_for(word)
-      rendered = template.render(
+      context = dict(
         url=url,
         canon_url=url_for(word),
         word=word.word,
         definition=word.definition,
         lastmod=lastmod)
-      c += 1
-      self.output(url, rendered, lastmod)
-    log(f'Generated {c:,} definition pages.')
+      jobs.append(PageJob(url, 'word_definition.html', context, lastmod))
+    self.render_pages(jobs)
+    log(f'Generated {len(jobs):,} definition pages.')
 
   def generate_sitemap(self) -> None:
-    pages = self.db.get_pages()
-    pages = filterl(lambda x:not x.path.startswith('/definition'), pages)
-    if len(pages) > 50_000 - 300:
-      log_error(f"Site map is close maximum size of 50k links: {len(pages)}")
-
-    template = self.env.get_template('internal/sitemap.xml')
-    rendered = template.render(pages=pages)
-    self.output('sitemap.xml', rendered, None, is_internal=True)
+    """
+      Write the sitemaps of the sections that changed since the last run, streamed from the ledger, and the
+      index of all of them. sitemap.xml links to the index, it is the url the search engines already know.
+    """
+    pages = self.ledger.iter_pages()
+    hashes = section_hashes(pages, config['DOMAIN'])
+    shards: Dict[str, List[Tuple[str, str]]] = {}
+    writers = {}
+    for section, hash in hashes.items():
+      meta = json.loads(self.db.get_meta(f'sitemap_{section}', '{}'))
+      if meta.get('hash') == hash and self.keep_sitemap(meta['shards']):
+        shards[section] = mapl(tuple, meta['shards'])
+        log(f'Sitemap of {section} is unchanged.')
+      else:
+        writers[section] = SectionWriter(self.out_dir, config['DOMAIN'], section)
+
+    if writers:
+      for page in pages:
+        writer = writers.get(get_section(page.path) or '')
+        if writer:
+          writer.add(page)
+    for section, writer in writers.items():
+      shards[section] = writer.close()
+      names = [ name for name, _ in shards[section] ]
+      for name in names:
+        self.add_file(name)
+      # Remove the shards that are not needed anymore.
+      for file in ls(joinp(self.out_dir, f'sitemap-{section}-*.xml')):
+        if basename(file) not in names:
+          for ext in [''] + SIDECARS:
+            rm(file + ext)
+            self.manifest.remove(basename(file) + ext)
+      self.db.set_meta(f'sitemap_{section}', json.dumps(dict(hash=hashes[section], shards=shards[section])))
+      log(f'Wrote sitemap of {section}: {joinl(names, sep=", ") or "no pages"}.')
+
+    index = render_index(config['DOMAIN'], [ shard for section, _ in SECTIONS for shard in shards[section] ])
+    self.output(INDEX, index, None, is_internal=True)
+    sitemap = joinp(self.out_dir, 'sitemap.xml')
+    if not os.path.islink(sitemap):
+      # It was the whole sitemap before there was an index.
+      for ext in [''] + SIDECARS:
+        rm(sitemap + ext)
+    self.ln(INDEX, 'sitemap.xml', '', is_internal=True)
+
+  def keep_sitemap(self, shards: List[Tuple[str, str]]) -> bool:
+    """ If the unchanged shards of a section are in the output dir, or can be linked from the previous generation. """
+    names = [ name for name, _ in shards ]
+    if all(exists(joinp(self.out_dir, name)) for name in names):
+      return True
+    if self.previous_dir and all(exists(joinp(self.previous_dir, name)) for name in names):
+      for name in names:
+        self.link_previous(name)
+      return True
+    return False
 
   def generate_css(self) -> None:
     if config['DEV']:
       return
-    shell(f'npx tailwindcss -i input.css -o data/out.css --minify')
-    config['CSS_VERSION'] = md5('data/out.css')
+    build_css()
+    config['CSS_VERSION'] = md5(CSS)
     self.env.globals.update(css_version=config['CSS_VERSION'])
 
   def generate_static(self) -> None:
-    mkdir(joinp(self.out_dir, 'static'))
-
     js_version = config['JS_VERSION']
     css_version = config['CSS_VERSION']
     if not config['DEV']:
-      shell(f'terser static_files/static/script.js --mangle -o {self.out_dir}/static/script.{js_version}.min.js')
-      cp('data/out.css', f"{self.out_dir}/static/style.{css_version}.css", verbose=True)
+      files = [f'static/script.{js_version}.min.js', f'static/style.{css_version}.css']
+      build_js()
+      copy_file(JS, joinp(self.out_dir, files[0]))
+      copy_file(CSS, joinp(self.out_dir, files[1]))
     else:
-      cp('static_files/static/script.js',  f'{self.out_dir}/static/script.{js_version}.js', verbose=True)
-      cp('static_files/static/custom.css', f'{self.out_dir}/static/custom.css', verbose=True)
-
-    for file in ls('static_files/*'):
-      shell(f'cp -a {file} {self.out_dir}', verbose=False)
-      log(f"Copied {file} to /{basename(file)}")
+      files = [f'static/script.{js_version}.js', 'static/custom.css']
+      copy_file('static_files/static/script.js', joinp(self.out_dir, files[0]))
+      copy_file('static_files/static/custom.css', joinp(self.out_dir, files[1]))
+
+    files += copy_tree('static_files', self.out_dir)
+    for file in files:
+      self.add_file(file)
+
+  def add_file(self, location: str) -> None:
+    """ Compress a file that was written without `save`, and add it and its sidecars to the manifest. """
+    compress_file(joinp(self.out_dir, location))
+    for path in [location] + [ location + ext for ext in SIDECARS ]:
+      if exists(joinp(self.out_dir, path)):
+        self.manifest.add_file(self.out_dir, path)
+      else:
+        self.manifest.remove(path)
 
   def check_for_ungenerated_files(self) -> None:
     current = config['SERVING_DEST']
@@ -365,25 +601,14 @@ class Generator:
       log(f'Not checking for missing files, {current} does not exist.')
       return
 
-    missing: List[str] = []
-    new_files: List[str]  = []
-    def cmp_dirs(new: str, old: str, dcmp=None):
-      if dcmp is None:
-        dcmp = filecmp.dircmp(new, old)
-
-      if dcmp.left_only:
-        new_files.extend(map(lambda x:joinp(new, x), dcmp.left_only))
-      if dcmp.right_only:
-        missing.extend(map(lambda x:joinp(old, x), dcmp.right_only))
-
-      for sub_dcmp in dcmp.subdirs.values():
-        cmp_dirs(sub_dcmp.left, sub_dcmp.right, sub_dcmp)
-
-    cmp_dirs(self.out_dir, current)
-    missing = mapl(lambda x:x.replace(config['SERVING_DEST'], ''), missing)
-    missing = filterl(lambda x:not x.endswith('.css'), missing)
-    missing = filterl(lambda x:not x.endswith('.js'), missing)
-    missing = filterl(lambda x:not x.endswith('report_all.html'), missing)
+    old = load_manifest(current)
+    new_files = self.manifest.paths() - old.paths()
+    def is_missing(path: str) -> bool:
+      # The sidecars are made with their file, and not for the files that are too small to compress.
+      if os.path.splitext(path)[1] in SIDECARS:
+        return False
+      return not (path.endswith('.css') or path.endswith('.js') or path.endswith('report_all.html'))
+    missing = sorted(map(lambda x:'/' + x, filter(is_missing, old.paths() - self.manifest.paths())))
     if missing:
       f = log_error if config['IGNORE_MISSING'] else log_fatal
       files = joinl(missing[:20])
@@ -393,9 +618,116 @@ class Generator:
     if new_files:
       log(f'Generated {len(new_files):,} files.')
 
+def load_manifest(gen_dir: str) -> Manifest:
+  """ The manifest of a generation, made from its files if it was generated before there were manifests. """
+  file = manifest_file(gen_dir)
+  if exists(file):
+    return Manifest.load(file)
+  log(f'No manifest for {gen_dir}, reading its files.')
+  return Manifest.from_dir(gen_dir) if exists(gen_dir) else Manifest()
+
+def verify_site(gen_dir: str) -> bool:
+  """ Check that the files of a generation are the ones in its manifest. """
+  file = manifest_file(gen_dir)
+  if not exists(file):
+    log_error(f'There is no manifest for {gen_dir}: {file}')
+    return False
+  manifest = Manifest.load(file)
+  problems = manifest.verify(gen_dir)
+  if problems:
+    log_error(f'{len(problems):,} of {len(manifest.files):,} files in {gen_dir} do not match the manifest:\n'
+      + joinl(problems[:50]) + ('\n...' if len(problems) > 50 else ''))
+  else:
+    log(f'All {len(manifest.files):,} files in {gen_dir} match the manifest.')
+  return not problems
+
 def url(path: str) -> str:
   return joinp(config['DOMAIN'], path)
 
+def page_path(location: str) -> str:
+  """ The path of the page in the ledger and site map. """
+  return '/' if location == '/index.html' else location
+
+# The first and last puzzle dates, for the date pickers of the puzzle pages.
+PUZZLE_DATES = '/puzzle-dates.json'
+
+# What the pages are rendered from, besides the db. If any of these change all the pages are regenerated.
+RENDER_SOURCES = ['generator.py', 'model.py', 'site_util.py']
+RENDER_CONFIG = ['DOMAIN', 'DEV', 'DEBUG', 'DEBUG_DICT', 'HTML_MIN', 'USE_ADSENSE', 'USE_AMAZON', 'USE_SIGNUP',
+  'JS_VERSION', 'CSS_VERSION']
+
+def get_render_hash() -> str:
+  templates = sorted(ls('templates/*') + ls('templates/*/*'))
+  files = [ md5(f) for f in RENDER_SOURCES + templates if is_file(f) ]
+  values = [ f'{key}={config.get(key)}' for key in RENDER_CONFIG ]
+  # The pages show the current year in the footer.
+  values.append(f'current_year={datetime.datetime.now().year}')
+  return md5_value(joinl(files + values))
+
+def make_env() -> Environment:
+  env = Environment(
+    loader=FileSystemLoader('templates'),
+    undefined=StrictUndefined,
+    trim_blocks=(not config['DEV']),
+    lstrip_blocks=(not config['DEV']))
+  set_env_globals(env)
+  set_bytecode_cache(env, 'generator')
+  return env
+
+@dataclass
+class PageJob:
+  """ A page to render, only plain data so that it can be sent to a worker process. """
+  location: str
+  template: str
+  context: Dict[str, Any]
+  lastmod: str
+  needs_regen: bool = False
+  old_hash: Optional[str] = None # The hash of the page that is on disk.
+
+@dataclass
+class RenderedPage:
+  hash: str
+  contents: Optional[str] # None if the page is the same as the one on disk.
+  sidecars: Dict[str, bytes] = field(default_factory=dict) # The compressed contents, see compress.py.
+  times: Dict[str, float] = field(default_factory=dict, compare=False) # For the profiler, like {'render_secs': 0.1}.
+
+def finish_page(contents: str, old_hash: Optional[str]) -> RenderedPage:
+  """ Hash the page, then minify and compress it, if it is not the same as the page on disk. """
+  minify = not config['DEV'] and config['HTML_MIN'] # Only in prod.
+  sidecars = sidecar_types()
+  # The hash is of the page before it is minified, so unchanged pages are never minified again.
+  # It includes the options, so the pages are rewritten when they change.
+  content_hash = md5_value(contents + ('<!-- minified -->' if minify else '') + joinl(sidecars, sep=''))
+  if content_hash == old_hash:
+    return RenderedPage(content_hash, None)
+  start = time.perf_counter()
+  if minify:
+    if contents.startswith('<!DOCTYPE html>') or contents.startswith('<html>'):
+      contents = minify_html(contents)
+  minified = time.perf_counter()
+  compressed = compress(contents.encode('utf-8'))
+  times = dict(minify_secs=minified - start, compress_secs=time.perf_counter() - minified)
+  return RenderedPage(content_hash, contents, compressed, times)
+
+# The Jinja environment of a worker process, see init_worker.
+_worker_env: Optional[Environment] = None
+
+def init_worker(values: Dict[str, Any]) -> None:
+  """ Set up a worker process, it gets the config of the parent since it may have been changed after it was loaded. """
+  global _worker_env
+  config.update(values)
+  _worker_env = make_env()
+
+def render_job(job: PageJob, env: Optional[Environment]=None) -> RenderedPage:
+  env = env or _worker_env
+  assert env is not None
+  start = time.perf_counter()
+  contents = env.get_template(job.template).render(**job.context)
+  render_secs = time.perf_counter() - start
+  rendered = finish_page(contents, job.old_hash)
+  rendered.times['render_secs'] = render_secs
+  return rendered
+
 @dataclass
 class Prefix:
   prefix: str
@@ -410,5 +742,13 @@ class ClueArchiveItem:
     return (self.text, self.dates) < (other.text, other.dates)
 
 if __name__ == '__main__':
-  generator = Generator()
-  generator.generate_all()
+  parser = argparse.ArgumentParser(description='Generate the site.')
+  parser.add_argument('--jobs', type=int, help='Number of processes that render the pages, 0 for one per CPU. Overrides GEN_JOBS.')
+  parser.add_argument('--verify', nargs='?', const=config['SERVING_DEST'], metavar='DIR',
+    help='Check the files of a generated site against its manifest, instead of generating. Defaults to SERVING_DEST.')
+  args = parser.parse_args()
+  if args.verify:
+    sys.exit(0 if verify_site(args.verify) else 1)
+  if args.jobs is not None:
+    config['GEN_JOBS'] = args.jobs
+  Generator().generate_all()
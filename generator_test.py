@@ -2,8 +2,14 @@
 import os
 import pytest
 import json
+import pickle
+from dataclasses import replace
 import db
+from testutils import temp_db, generator, generator_config
+from testdata import *
+from snapshot import Snapshot
 from generator import *
+from jinja2 import DictLoader
 
 @pytest.mark.parametrize('input_str, expected', [
   ('dog', 'd'),
@@ -21,3 +27,213 @@ from generator import *
 ])
 def test_get_clue_archive_prefix(input_str, expected):
   assert Generator.get_clue_archive_prefix(input_str) == expected
+
+def test_output_skips_unchanged_pages(generator):
+  path = joinp(generator.out_dir, '/clue/a')
+
+  generator.output('/clue/a', '<html>a</html>', '2025-01-01')
+  generator.output('/clue/a', '<html>a</html>', '2025-01-02')
+
+  assert (generator.written, generator.unchanged) == (1, 1)
+  assert generator.ledger.get('/clue/a').lastmod == '2025-01-01'
+
+  generator.output('/clue/a', '<html>b</html>', '2025-01-03')
+
+  assert (generator.written, generator.unchanged) == (2, 1)
+  assert generator.ledger.get('/clue/a').lastmod == '2025-01-03'
+  generator.writer.wait()
+  assert read(path) == '<html>b</html>'
+
+def test_render_job_skips_unchanged_pages():
+  env = Environment(loader=DictLoader({'page.html': '<html>{{ word }}</html>'}))
+  job = PageJob('/clue/a', 'page.html', dict(word='a'), '2025-01-01')
+
+  rendered = render_job(job, env)
+  assert rendered.contents == '<html>a</html>'
+
+  job.old_hash = rendered.hash
+  assert render_job(job, env) == RenderedPage(rendered.hash, None)
+
+def test_templates_are_compiled_once(fs, monkeypatch):
+  monkeypatch.setitem(config, 'JINJA_CACHE_DIR', 'data/jinja_cache')
+  write('templates/page.html', '<html>{{ 1 + 1 }}</html>', create_dirs=True)
+  write('static_files/static/script.js', '', create_dirs=True)
+  assert make_env().get_template('page.html').render() == '<html>2</html>'
+  assert len(ls('data/jinja_cache/*.cache')) == 1
+
+  # A new process loads the compiled template from the cache.
+  monkeypatch.setattr(Environment, 'compile', lambda *args, **kwargs:pytest.fail('compiled again'))
+  assert make_env().get_template('page.html').render() == '<html>2</html>'
+
+def test_page_job_can_be_pickled():
+  definition = GDefinition(word='a', retrieved_on='2025-01-01', retrieved_from='test', raw=None)
+  definition.set_raw_loader(lambda: {'raw': 1})
+  job = PageJob('/definition/a', 'page.html', dict(definition=definition), '2025-01-01')
+
+  copy = pickle.loads(pickle.dumps(job))
+
+  assert copy.context['definition'].word == 'a'
+  assert copy.context['definition'].raw is None
+  assert definition.raw == {'raw': 1}
+
+def test_find_affected(generator_config):
+  db = DB()
+  id_1 = db.insert(P_1)
+  id_2 = db.insert(P_2)
+  clue_id = db.insert(CL1_A)
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_1, clue_id=clue_id))
+  db.insert(Answer(word=W1_B, is_pangram=False, puzzle_id=id_2, clue_id=None))
+  db.commit()
+  revision = db.get_revision()
+  # The next import.
+  db = DB()
+  db.insert(Answer(word=W1_C, is_pangram=False, puzzle_id=id_2, clue_id=None))
+  db.insert_definition(GDEF1_A)
+  db.commit()
+  generator = Generator()
+  generator.data = Snapshot.load(db)
+  generator.changes = db.changed_since(revision)
+
+  # The new answer changes its puzzle and the one that links to it, the definition changes the pages of its word.
+  assert generator.find_affected() == {P1_URL, P2_URL, U1_A, '/definition/' + W1_A}
+
+def test_find_affected_new_puzzle(generator_config):
+  db = DB()
+  id_1 = db.insert(P_1)
+  id_2 = db.insert(P_2)
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_1, clue_id=db.insert(CL1_A)))
+  db.insert(Answer(word=W1_B, is_pangram=False, puzzle_id=id_2, clue_id=None))
+  db.insert_definition(GDEF1_A)
+  db.commit()
+  revision = db.get_revision()
+  # The next day's puzzle, with an answer of an older puzzle and a new word.
+  d3 = '2024-12-30'
+  db = DB()
+  id_3 = db.insert(replace(P_2, date=d3))
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_3, clue_id=db.insert(Clue(text='Outsmarted', url='/clue/outsmarted'))))
+  db.insert(Answer(word=W1_C, is_pangram=False, puzzle_id=id_3, clue_id=None))
+  db.insert_definition(GDefinitions(word=W1_C, defs=[]))
+  db.commit()
+  generator = Generator()
+  generator.data = Snapshot.load(db)
+  generator.changes = db.changed_since(revision)
+
+  # Not the older puzzle and clue of the same answer.
+  assert generator.find_affected() == {url_for(d3), P2_URL, '/clue/outsmarted', '/definition/' + W1_C}
+
+def test_find_affected_latest_clue(generator_config):
+  db = DB()
+  id_1 = db.insert(P_1)
+  id_2 = db.insert(P_2)
+  db.insert(Answer(word=W1_B, is_pangram=False, puzzle_id=id_1, clue_id=None))
+  db.insert(Answer(word=W1_B, is_pangram=False, puzzle_id=id_2, clue_id=db.insert(CL1_B)))
+  db.insert_definition(GDefinitions(word=W1_B, defs=[]))
+  db.commit()
+  revision = db.get_revision()
+  d3 = '2024-12-30'
+  db = DB()
+  id_3 = db.insert(replace(P_2, date=d3))
+  db.insert(Answer(word=W1_B, is_pangram=False, puzzle_id=id_3, clue_id=db.insert(Clue(text='Bean curd', url='/clue/bean-curd'))))
+  db.commit()
+  generator = Generator()
+  generator.data = Snapshot.load(db)
+  generator.changes = db.changed_since(revision)
+
+  # P_1 has no clue for the answer, it shows the new clue instead of the one of P_2.
+  assert generator.find_affected() == {url_for(d3), P2_URL, '/clue/bean-curd', P1_URL, U1_B}
+
+def test_new_puzzle_updates_the_date_range(generator_config):
+  def insert_puzzle(puzzle, word):
+    db.insert(Answer(word=word, is_pangram=True, puzzle_id=db.insert(puzzle), clue_id=None))
+  db = DB()
+  insert_puzzle(P_1, W1_A)
+  insert_puzzle(P_2, W1_A)
+  db.commit()
+  revision = db.get_revision()
+  d3 = '2025-01-03'
+  db = DB()
+  insert_puzzle(replace(P_2, date=d3), W1_B)
+  db.commit()
+  generator = Generator()
+  generator.data = Snapshot.load(db)
+  generator.changes = db.changed_since(revision)
+  generator.env = Environment(loader=DictLoader({ name: '' for name in
+    ['index.html', 'about.html', 'about_other_answers.html', 'internal/error.html'] }))
+
+  generator.generate_main()
+
+  # P_1 doesn't link to the new puzzle, its date picker reads the new range.
+  assert P1_URL not in generator.find_affected()
+  generator.writer.wait()
+  assert json.loads(read(joinp(generator.out_dir, PUZZLE_DATES))) == dict(min=D1, max=d3)
+
+def test_clue_archive_lastmods(generator):
+  def answer(text, date, archive_prefix):
+    return GAnswer(word=text, is_pangram=False, text=text, url='/clue/' + text, puzzle_date=date,
+      definitions=GDefinitions(word=text, defs=[]), archive_prefix=archive_prefix)
+  generator.data = Snapshot([answer('avocado', D2, 'a'), answer('apple', D1, 'a'), answer('Banana', D1, None)], [], [], [], 1)
+  generator.env = Environment(loader=DictLoader({'clue_archive_index.html': ''}))
+  jobs: List[PageJob] = []
+  generator.render_pages = jobs.extend
+
+  generator.generate_clue_archives(n_per_page=1)
+
+  # A page is as new as its clues and the ones before it.
+  assert [ (job.location, job.lastmod) for job in jobs ] == [('/clues/a/1', D1), ('/clues/a/2', D2), ('/clues/b/1', D1)]
+
+def test_full_links_unchanged_pages(generator_config, monkeypatch):
+  mkdir('site/sbb-old')
+  os.symlink('sbb-old', 'site/current')
+  generator = Generator()
+  generator.output('/clue/a', '<html>a</html>', '2025-01-01')
+  generator.writer.close()
+  generator.ledger.flush()
+
+  monkeypatch.setitem(config, 'FULL', True)
+  generator = Generator()
+  generator.output('/clue/a', '<html>a</html>', '2025-01-02')
+
+  assert (generator.written, generator.linked) == (0, 1)
+  assert generator.ledger.get('/clue/a').lastmod == '2025-01-01'
+  path = joinp(generator.out_dir, '/clue/a')
+  assert os.stat(path).st_nlink == 2
+
+  # Changing the page doesn't change the previous generation.
+  generator.output('/clue/a', '<html>b</html>', '2025-01-03')
+  generator.writer.wait()
+  assert read(path) == '<html>b</html>'
+  assert read('site/sbb-old/clue/a') == '<html>a</html>'
+
+def test_sitemap_only_writes_changed_sections(generator):
+  generator.output('/clue/a', '<html>a</html>', '2025-01-01')
+  generator.output('/puzzle/2025-01-01', '<html>p</html>', '2025-01-01')
+  generator.output('/definition/a', '<html>d</html>', '2025-01-01')
+  generator.generate_sitemap()
+
+  clues = joinp(generator.out_dir, 'sitemap-clues-1.xml')
+  puzzles = joinp(generator.out_dir, 'sitemap-puzzles-1.xml')
+  assert '/clue/a' in read(clues)
+  assert 'sitemap-puzzles-1.xml' in read(joinp(generator.out_dir, 'sitemap.xml'))
+  assert '/definition/' not in read(clues) + read(puzzles)
+
+  rm(puzzles)
+  write(clues, 'unchanged')
+  generator.output('/puzzle/2025-01-02', '<html>p</html>', '2025-01-02')
+  generator.generate_sitemap()
+
+  assert read(clues) == 'unchanged'
+  assert '/puzzle/2025-01-02' in read(puzzles)
+
+def test_check_for_ungenerated_files(generator_config, monkeypatch):
+  monkeypatch.setitem(config, 'FULL', True)
+  monkeypatch.setitem(config, 'IGNORE_MISSING', True)
+  mkdir('site/sbb-old')
+  os.symlink('sbb-old', 'site/current')
+  Manifest({'clue/a': (1, 'x'), 'clue/a.gz': (1, 'x'), 'clue/b': (1, 'x'), 'clue/b.gz': (1, 'x'), 'static/style.css': (1, 'x')}).save('site/sbb-old.manifest')
+  mkdir('data')
+  generator = Generator()
+  generator.output('/clue/a', '<html>a</html>', '2025-01-01')
+
+  generator.check_for_ungenerated_files()
+
+  assert read('data/missing.txt') == '/clue/b'
@@ -5,7 +5,7 @@ import sqlite3
 import unicodedata
 import re
 from dataclasses import dataclass, asdict, fields, field
-from typing import List, Any, Dict, Optional, Set
+from typing import List, Any, Dict, Optional, Set, Tuple
 from pyutils import *
 from pyutils.settings import config
 from hint_generator import HintGenerator
@@ -21,7 +21,7 @@ DIR = 'scraped/*.json'
 class Importer:
   def __init__(self):
     self.dicts = Dicts()
-    self.db = DB()
+    self.db = DB('writer')
     self.es = ElasticSearch()
     self.wordlist = Wordlist()
 
@@ -29,15 +29,20 @@ class Importer:
     # Elastic search needs the entries to be inserted in order, so the more recent entry have precedence.
     files = sorted(files)
     files = filter(lambda f:not self.db.is_imported(f), files)
-    n = 0
+    # The rows are collected for all the files and written in bulk at the end.
+    puzzles: List[Puzzle] = []
+    clues: List[Clue] = []
+    # (date, word, is_pangram, clue text), the ids of the puzzle and clue are not known until they are written.
+    answers: List[Tuple[str, str, bool, Optional[str]]] = []
+    imported = []
     for file in files:
       log(f"Importing {file}")
       content = json.loads(read(file))
       date = content['print_date']
-      answers = content['answers'] + content['pangrams']
+      words = content['answers'] + content['pangrams']
       outer_letters = content['outer_letters'].upper()
       center_letter = content['center_letter'].upper()
-      missing_answers = self.missing_answers(center_letter, outer_letters, answers)
+      missing_answers = self.missing_answers(center_letter, outer_letters, words)
 
       puzzle = Puzzle(
         id = content['id'],
@@ -48,7 +53,7 @@ class Importer:
         hints = "") # The definitions are needed before hints can be created.
       # Re-import everything, even if rows already exist.
       # Puzzles are upate on their post day with clues later.
-      puzzle_id = self.db.upsert_puzzle(puzzle, ignore_dups=True) # don't overwrite existing row.
+      puzzles.append(puzzle)
       self.es.upsert_puzzle(date, center_letter, outer_letters)
 
       if content.get('clues', None): # Check if clues are present, because they are not available right away.
@@ -57,38 +62,34 @@ class Importer:
           word = content_clue['word']
           is_pangram = word in content['pangrams']
 
-          clue_id = None
           if text: # Sometimes a clue will be missing, i.e. there's no text
             url = get_clue_url(text)
-            clue = Clue(text = text, url = url)
-            clue_id = self.db.upsert_clue(clue)
+            clues.append(Clue(text = text, url = url))
             self.es.upsert_clue(url, word, text, date)
-
-          answer = Answer(word = word,
-            puzzle_id = puzzle_id,
-            clue_id = clue_id,
-            is_pangram = is_pangram)
-          self.db.upsert_answer(answer)
-          self.db.mark_as_imported(file) # Don't reimport this file.
+          answers.append((date, word, is_pangram, text or None))
+        imported.append(file) # Don't reimport this file.
       else:
         # Clues are not present in the json.
-        for word in answers:
+        for word in words:
           is_pangram = word in content['pangrams']
-          answer = Answer(word = word,
-            puzzle_id = puzzle_id,
-            clue_id = None,
-            is_pangram = is_pangram)
-          self.db.upsert_answer(answer)
-      n += 1
+          answers.append((date, word, is_pangram, None))
+
+    puzzle_ids = dict(zip([ p.date for p in puzzles ], self.db.upsert_puzzles(puzzles, ignore_dups=True))) # don't overwrite existing rows.
+    clue_ids = dict(zip([ c.text for c in clues ], self.db.upsert_clues(clues)))
+    self.db.upsert_answers([ Answer(word = word,
+        puzzle_id = puzzle_ids[date],
+        clue_id = clue_ids[text] if text else None,
+        is_pangram = is_pangram) for date, word, is_pangram, text in answers ])
+    for file in imported:
+      self.db.mark_as_imported(file)
     self.db.commit()
     self.es.commit()
-    log(f"Imported {n} files.")
+    log(f"Imported {len(puzzles)} files.")
 
   def import_definitions(self) -> None:
     undefined = self.db.fetch_undefined_words()
     definitions = self.dicts.lookup(undefined)
-    for deff in definitions:
-      self.db.insert_definition(deff)
+    self.db.insert_definitions(definitions)
     self.db.commit()
 
   def generate_hints_and_missing_answers_from_defs(self) -> None:
@@ -120,8 +121,7 @@ class Importer:
       puzzle.missing_answers = new_answers
     log(f"Updated missing answers for {c} puzzles.")
 
-    for puzzle in puzzles:
-      self.db.upsert_gpuzzle(puzzle)
+    self.db.upsert_gpuzzles(puzzles)
     self.db.commit()
 
   def missing_answers(self, center_letter: str, outer_letters: str, answers: List[str]) -> List[str]:
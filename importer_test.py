@@ -81,7 +81,7 @@ def test_files_not_reimported(temp_db, fake_files, mock_es):
   assert not importer.db.is_imported(FILE_1_NOCLUES)
   assert importer.db.is_imported(FILE_2)
 
-def test_import_definitions(temp_db, fake_files, mock_es):
+def test_import_definitions(temp_db, fake_files, mock_es, fake_mw_api_key):
   importer = imp.Importer()
   importer.import_files([FILE_1])
   assert importer.db.fetch_undefined_words() == sorted([W1_A, W1_B, W1_C])
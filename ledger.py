@@ -0,0 +1,50 @@
+from typing import List, Dict, Iterable, Optional
+from pyutils import *
+from storage import Page
+from db import DB
+
+class Ledger:
+  """
+    In memory copy of the generated table: the pages that have been generated and their lastmod.
+    It is read once when the generator starts, and the pages marked as generated are written back in
+    one transaction by `flush`.
+  """
+  def __init__(self, db: DB):
+    self.db = db
+    # In the same order as the table, so the sitemap doesn't change order.
+    self.pages: Dict[str, Page] = { page.path: page for page in db.get_pages() }
+    self.pending: Dict[str, Page] = {} # Not written to the db yet.
+    log(f'Loaded {len(self.pages):,} generated pages.')
+
+  def is_generated(self, path: str, lastmod: Optional[str]=None) -> bool:
+    """ If the page at `path` was generated, doesn't need to be regenerated and is at least as new as `lastmod`. """
+    page = self.pages.get(path)
+    if page is None or page.needs_regen:
+      return False
+    return lastmod is None or page.lastmod >= lastmod
+
+  def get(self, path: str) -> Optional[Page]:
+    return self.pages.get(path)
+
+  def mark_as_generated(self, path: str, lastmod: str, needs_regen: bool=False, hash: Optional[str]=None) -> None:
+    page = Page(path=path, lastmod=lastmod, needs_regen=needs_regen, hash=hash)
+    self.pages[path] = page
+    self.pending[path] = page
+
+  def get_pages(self) -> List[Page]:
+    return list(self.pages.values())
+
+  def iter_pages(self) -> Iterable[Page]:
+    """ The pages in the same order as `get_pages`, without copying them. """
+    return self.pages.values()
+
+  def clear(self) -> None:
+    self.db.clear_generated()
+    self.pages.clear()
+    self.pending.clear()
+
+  def flush(self) -> None:
+    self.db.upsert_pages(list(self.pending.values()))
+    self.db.commit()
+    log(f'Marked {len(self.pending):,} pages as generated.')
+    self.pending.clear()
@@ -0,0 +1,50 @@
+import pytest
+from pyutils import *
+from testutils import *
+from testdata import *
+from db import *
+from ledger import Ledger
+
+def test_ledger(temp_db):
+  db = DB()
+  db.upsert_pages([
+    Page(path='/a', lastmod=D1, needs_regen=False),
+    Page(path='/b', lastmod=D1, needs_regen=True)])
+  db.commit()
+
+  ledger = Ledger(db)
+
+  assert ledger.is_generated('/a')
+  assert ledger.is_generated('/a', lastmod=D1)
+  assert not ledger.is_generated('/a', lastmod=D2)
+  assert not ledger.is_generated('/b')
+  assert not ledger.is_generated('/c')
+
+  ledger.mark_as_generated('/c', D2)
+  ledger.mark_as_generated('/a', D2)
+  assert ledger.is_generated('/a', lastmod=D2)
+  assert ledger.is_generated('/c')
+  # Nothing is written until the ledger is flushed.
+  assert mapl(lambda p:p.path, db.get_pages()) == ['/a', '/b']
+
+  ledger.flush()
+
+  expected = [
+    Page(path='/a', lastmod=D2, needs_regen=False),
+    Page(path='/b', lastmod=D1, needs_regen=True),
+    Page(path='/c', lastmod=D2, needs_regen=False)]
+  assert ledger.get_pages() == expected
+  assert list(db.get_pages()) == expected
+  assert Ledger(db).get_pages() == expected
+
+def test_ledger_clear(temp_db):
+  db = DB()
+  ledger = Ledger(db)
+  ledger.mark_as_generated('/a', D1)
+  ledger.flush()
+
+  ledger.clear()
+  ledger.mark_as_generated('/b', D1)
+  ledger.flush()
+
+  assert list(db.get_pages()) == [Page(path='/b', lastmod=D1, needs_regen=False)]
@@ -0,0 +1,77 @@
+import os
+import hashlib
+from typing import List, Dict, Set, Tuple, Optional
+from pyutils import *
+
+LINK = 'link:' # The hash of a symlink is its target.
+
+class Manifest:
+  """
+    The files of a generation of the site: their path relative to the generation dir, size and md5.
+    The generator records the files as it writes them, so the generations can be compared and checked
+    without reading the whole tree. It is saved next to the generation dir, where nginx doesn't serve it.
+  """
+  def __init__(self, files: Optional[Dict[str, Tuple[int, str]]]=None):
+    self.files: Dict[str, Tuple[int, str]] = files or {}
+
+  def add(self, path: str, data: bytes) -> None:
+    self.files[path.lstrip('/')] = (len(data), hashlib.md5(data).hexdigest())
+
+  def add_file(self, base_dir: str, path: str) -> None:
+    """ Add a file that was written by something else, like a copy or a symlink. """
+    full_path = joinp(base_dir, path)
+    if os.path.islink(full_path):
+      self.files[path.lstrip('/')] = (0, LINK + os.readlink(full_path))
+    else:
+      with open(full_path, 'rb') as f:
+        self.add(path, f.read())
+
+  def remove(self, path: str) -> None:
+    self.files.pop(path.lstrip('/'), None)
+
+  def paths(self) -> Set[str]:
+    return set(self.files.keys())
+
+  def save(self, file: str) -> None:
+    lines = [ f'{path}\t{size}\t{hash}' for path, (size, hash) in sorted(self.files.items()) ]
+    write(file, joinl(lines) + '\n')
+
+  @staticmethod
+  def load(file: str) -> 'Manifest':
+    files = {}
+    for line in read_lines(file):
+      if line:
+        path, size, hash = line.split('\t')
+        files[path] = (int(size), hash)
+    return Manifest(files)
+
+  @staticmethod
+  def from_dir(base_dir: str) -> 'Manifest':
+    """ The manifest of the files in a dir, for the generations from before there were manifests. """
+    manifest = Manifest()
+    for root, dirs, files in os.walk(base_dir):
+      for name in files + [ d for d in dirs if os.path.islink(joinp(root, d)) ]:
+        manifest.add_file(base_dir, os.path.relpath(joinp(root, name), base_dir))
+    return manifest
+
+  def verify(self, base_dir: str) -> List[str]:
+    """ The files in `base_dir` that are missing or different from the manifest. """
+    problems = []
+    for path, (size, hash) in sorted(self.files.items()):
+      full_path = joinp(base_dir, path)
+      if hash.startswith(LINK):
+        if not os.path.islink(full_path) or LINK + os.readlink(full_path) != hash:
+          problems.append(f'{path}: is not a link to {hash[len(LINK):]}')
+      elif not exists(full_path):
+        problems.append(f'{path}: is missing')
+      elif os.path.getsize(full_path) != size:
+        problems.append(f'{path}: size is {os.path.getsize(full_path):,}, expected {size:,}')
+      else:
+        with open(full_path, 'rb') as f:
+          if hashlib.md5(f.read()).hexdigest() != hash:
+            problems.append(f'{path}: contents changed')
+    return problems
+
+def manifest_file(gen_dir: str) -> str:
+  """ Where the manifest of the generation in `gen_dir` is saved. """
+  return os.path.realpath(gen_dir).rstrip('/') + '.manifest'
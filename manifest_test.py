@@ -0,0 +1,34 @@
+import os
+import pytest
+from pyutils import *
+from manifest import *
+
+def test_manifest(fs):
+  write('site/sbb-1/clue/a', 'a', create_dirs=True)
+  write('site/sbb-1/index.html', 'index')
+  os.symlink('a', 'site/sbb-1/clue/latest')
+  manifest = Manifest()
+  manifest.add('/clue/a', b'a')
+  manifest.add('/index.html', b'index')
+  manifest.add_file('site/sbb-1', 'clue/latest')
+  manifest.save(manifest_file('site/sbb-1'))
+
+  loaded = Manifest.load('site/sbb-1.manifest')
+
+  assert loaded.files == manifest.files == Manifest.from_dir('site/sbb-1').files
+  assert loaded.paths() == {'clue/a', 'clue/latest', 'index.html'}
+  assert loaded.files['clue/latest'] == (0, 'link:a')
+  assert loaded.verify('site/sbb-1') == []
+
+def test_manifest_verify(fs):
+  write('site/sbb-1/a', 'a', create_dirs=True)
+  write('site/sbb-1/b', 'b')
+  manifest = Manifest.from_dir('site/sbb-1')
+  manifest.add('/c', b'c')
+  write('site/sbb-1/a', 'x')
+  write('site/sbb-1/b', 'bb')
+
+  assert manifest.verify('site/sbb-1') == [
+    'a: contents changed',
+    'b: size is 2, expected 1',
+    'c: is missing']
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import sys
+import time
+import htmlmin
+from typing import List, Callable
+from pyutils import *
+from pyutils.settings import config
+from minify import minify_html
+
+# Compares the speed and output size of the minifier with htmlmin, on the html pages of a generated site.
+
+def minify_htmlmin(html: str) -> str:
+  # The options that the generator used with htmlmin.
+  return htmlmin.minify(html,
+    remove_comments=True,
+    remove_empty_space=True,
+    remove_all_empty_space=False,
+    reduce_boolean_attributes=False,
+    remove_optional_attribute_quotes=False)
+
+def load_pages(site_dir: str) -> List[str]:
+  pages = []
+  for root, _, files in os.walk(site_dir, followlinks=False):
+    for f in files:
+      path = joinp(root, f)
+      if os.path.islink(path):
+        continue
+      try:
+        contents = read(path)
+      except UnicodeDecodeError:
+        continue
+      if contents.startswith('<!DOCTYPE html>') or contents.startswith('<html>'):
+        pages.append(contents)
+  return pages
+
+def bench(name: str, minify: Callable[[str], str], pages: List[str], repeat: int) -> None:
+  size = sum(map(len, pages))
+  start = time.perf_counter()
+  for _ in range(repeat):
+    out_size = sum(len(minify(page)) for page in pages)
+  secs = (time.perf_counter() - start) / repeat
+  print(f'{name:8} {secs*1000:9.1f}ms {size / secs / 1e6:7.2f} MB/s {len(pages) / secs:9.1f} pages/s '
+    f'{out_size:12,} bytes ({out_size / size:.1%} of input)')
+
+if __name__ == '__main__':
+  site_dir = sys.argv[1] if len(sys.argv) > 1 else joinp(config['SITE_DIR'], 'current')
+  repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+  pages = load_pages(site_dir)
+  if not pages:
+    log_fatal(f'Usage: {sys.argv[0]} [site_dir] [repeat]\nNo html pages in {site_dir}, run the generator with HTML_MIN=False first.')
+  print(f'{len(pages):,} pages, {sum(map(len, pages)):,} bytes, from {site_dir}')
+  bench('htmlmin', minify_htmlmin, pages, repeat)
+  bench('regex', minify_html, pages, repeat)
@@ -0,0 +1,39 @@
+import pytest
+import htmlmin
+from minify import *
+
+@pytest.mark.parametrize('html, expected', [
+  ('<div>\n  <p>a  b\n c</p>\n</div>', '<div><p>a b c</p></div>'),
+  ('<p>\n  text\n</p>', '<p> text </p>'),
+  ('<b>a</b> <i>b</i>\n<i>c</i>', '<b>a</b> <i>b</i><i>c</i>'),
+  ('<a  href="x"\n   class="a  b"\n>t</a>', '<a href="x" class="a  b">t</a>'),
+  ('<p>a<!-- comment -->b</p>\n<!-- comment -->\n<p>c</p>', '<p>ab</p><p>c</p>'),
+  ('<!--[if IE]>ie<![endif]-->', '<!--[if IE]>ie<![endif]-->'),
+  ('<pre class="x">  a\n  b</pre>\n<script>\n var a  =  1;\n</script>', '<pre class="x">  a\n  b</pre><script>\n var a  =  1;\n</script>'),
+  ('<p>a  b\t\tc</p>', '<p>a  b c</p>'),
+])
+def test_minify_html(html, expected):
+  assert minify_html(html) == expected
+
+def test_minify_html_matches_htmlmin():
+  html = '''<!DOCTYPE html>
+<html>
+  <head>
+    <title>Spelling  Bee</title>
+    <script type="application/ld+json">
+      {"a":  1}
+    </script>
+  </head>
+  <body>
+    <!-- The puzzle -->
+    <ul id="hints"  class="list-disc pl-6">
+      <li>Hint  one</li>
+      <li>
+        Hint two
+      </li>
+    </ul>
+  </body>
+</html>
+'''
+  expected = htmlmin.minify(html, remove_comments=True, remove_empty_space=True, remove_optional_attribute_quotes=False)
+  assert minify_html(html) == expected
@@ -1,7 +1,7 @@
 import json
 from dataclasses import dataclass, asdict, fields, field
 import datetime
-from typing import List, Any, Dict, Optional
+from typing import List, Any, Dict, Optional, Callable, Set
 from math import ceil
 from functools import lru_cache
 from pyutils import *
@@ -22,13 +22,20 @@ class GDefinition:
   word: str
   retrieved_on: str
   retrieved_from: str # The API endpoint.
-  raw: Any # The unparsed json received from the API.
+  # The unparsed json received from the API. This is large and mostly unused, so the DB
+  # only loads it when it is first accessed, see `set_raw_loader`.
+  raw: Any
 
   # These are only present if the definition was parsed
   source_url: Optional[str] = None # URL of the human readable definition
   # Parsed definition, ready for frontend.
   word_types: List[GWordTypeDefinition] = field(default_factory=list)
 
+  def set_raw_loader(self, loader: Callable[[], Any]) -> None:
+    """ `raw` will be set to the result of `loader()` when it is first accessed. """
+    self._raw = None
+    self._raw_loader: Optional[Callable[[], Any]] = loader
+
   @property
   def is_mw(self) -> bool:
     return "https://dictionaryapi.com" in self.retrieved_from
@@ -45,6 +52,12 @@ class GDefinition:
       return None
     return url_domain(self.source_url)
 
+  def __getstate__(self):
+    # The loader can't be pickled, an unloaded `raw` is sent as None.
+    state = self.__dict__.copy()
+    state['_raw_loader'] = None
+    return state
+
   def __repr__(self):
     return self.__str__()
 
@@ -52,14 +65,34 @@ class GDefinition:
     l = []
     for field in fields(self):
       max_len = 10
-      val = getattr(self, field.name)
-      if field.name == 'raw' and val:
-        val = repr(val)[:max_len-3] + '...'
+      if field.name == 'raw':
+        # Don't trigger loading the raw json just for printing.
+        val = self._raw
+        if self._raw_loader:
+          val = '<not loaded>'
+        elif val:
+          val = repr(val)[:max_len-3] + '...'
+      else:
+        val = getattr(self, field.name)
       l.append(f'{field.name}={val}')
     l.append(f'is_mw={self.is_mw}')
     l.append(f'parsed={self.parsed}')
     return f"GDefinition({joinl(l, sep=', ')})"
 
+def _get_raw(self: GDefinition) -> Any:
+  if self._raw_loader:
+    loader, self._raw_loader = self._raw_loader, None
+    self._raw = loader()
+  return self._raw
+
+def _set_raw(self: GDefinition, raw: Any) -> None:
+  self._raw = raw
+  self._raw_loader = None
+
+# `raw` is still a dataclass field (it is in the constructor, asdict() and ==), but it is
+# accessed through this property so that it can be loaded lazily.
+GDefinition.raw = property(_get_raw, _set_raw) # type: ignore
+
 
 @dataclass
 class GDefinitions:
@@ -96,6 +129,8 @@ class GAnswer:
   url: Optional[str] # URL of the clue page for this answer, multiple answers can have the same url.
   puzzle_date: str
   definitions: GDefinitions
+  archive_prefix: Optional[str] = field(default=None, compare=False) # The clue archive page of the clue, from its text.
+  latest_clue: bool = field(default=False, compare=False) # The answer has no clue, it has the latest clue of the word.
   def __lt__(self, other):
     if self.word == other.word:
       return self.puzzle_date > other.puzzle_date
@@ -200,6 +235,14 @@ def format_yearmonth(value: str) -> str:
   date = datetime.datetime.strptime(value, "%Y-%m")
   return date.strftime("%B, %Y")
 
+@dataclass
+class Changes:
+  """ What is affected by the rows that changed between two revisions of the db. """
+  dates: Set[str] # The dates of the puzzles.
+  clue_urls: Set[str]
+  answer_words: Set[str]
+  definition_words: Set[str]
+
 @dataclass
 class PaginateList:
   """ Creates pagination links for page from a list of URLs. """
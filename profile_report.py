@@ -0,0 +1,93 @@
+import json
+import time
+import resource
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, fields
+from typing import List, Dict, Any, Iterator, Optional
+from pyutils import *
+from pyutils.settings import config
+
+@dataclass
+class StageStats:
+  """
+    The time and memory used by one stage of the generator. The cpu time is of the generator process, the pages
+    rendered by the workers are in render/minify/compress_secs, which are summed over all the processes.
+  """
+  name: str
+  wall_secs: float = 0
+  cpu_secs: float = 0
+  pages: int = 0 # Pages that were saved, including the unchanged and linked ones.
+  written: int = 0
+  bytes: int = 0 # Of the written pages, without the sidecars.
+  render_secs: float = 0
+  minify_secs: float = 0
+  compress_secs: float = 0
+  write_secs: float = 0 # Waiting for the writer threads, see writer.py.
+  max_rss_mb: float = 0 # The high-water mark of the generator process so far.
+  traced_peak_mb: Optional[float] = None # The peak of the python allocations in this stage, with PROFILE_TRACEMALLOC.
+
+class Profiler:
+  """
+    Times the stages of a generator run. The stats are logged at the end of the run and appended to
+    PROFILE_REPORT as one JSON line per run, so runs can be compared.
+  """
+  def __init__(self):
+    self.stages: List[StageStats] = []
+    self.current: Optional[StageStats] = None
+    self.started = time.time()
+    if config['PROFILE_TRACEMALLOC'] and not tracemalloc.is_tracing():
+      tracemalloc.start()
+
+  @contextmanager
+  def stage(self, name: str) -> Iterator[StageStats]:
+    stats = self.current = StageStats(name=name)
+    if tracemalloc.is_tracing():
+      tracemalloc.reset_peak()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+      yield stats
+    finally:
+      stats.wall_secs = time.perf_counter() - wall
+      stats.cpu_secs = time.process_time() - cpu
+      stats.max_rss_mb = max_rss_mb()
+      if tracemalloc.is_tracing():
+        stats.traced_peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+      self.stages.append(stats)
+      self.current = None
+
+  def add(self, **values: float) -> None:
+    """ Add to the counters of the current stage, like `add(pages=1, write_secs=0.1)`. """
+    if self.current is None:
+      return
+    for name, value in values.items():
+      setattr(self.current, name, getattr(self.current, name) + value)
+
+  def report(self, **run: Any) -> Dict[str, Any]:
+    """ Log the stats and append them to PROFILE_REPORT, with the values that describe the `run`. """
+    total = StageStats(name='total')
+    for stats in self.stages:
+      for f in fields(StageStats):
+        if f.name not in ['name', 'max_rss_mb', 'traced_peak_mb']:
+          setattr(total, f.name, getattr(total, f.name) + getattr(stats, f.name))
+    total.max_rss_mb = max_rss_mb()
+    lines = [ format_stats(stats) for stats in self.stages + [total] ]
+    log('Generator stages:\n' + joinl(lines))
+
+    result = dict(started=datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+      **run, total=asdict(total), stages=[ asdict(stats) for stats in self.stages ])
+    if config['PROFILE_REPORT']:
+      mkdir(dirname(config['PROFILE_REPORT']))
+      append(config['PROFILE_REPORT'], json.dumps(result) + '\n')
+      log(f"Appended the stats to {config['PROFILE_REPORT']}")
+    return result
+
+def format_stats(s: StageStats) -> str:
+  rate = s.pages / s.wall_secs if s.wall_secs else 0
+  traced = f' {s.traced_peak_mb:7.1f}MB traced' if s.traced_peak_mb is not None else ''
+  return (f'{s.name:16} {s.wall_secs:7.2f}s {s.cpu_secs:7.2f}s cpu {s.pages:7,} pages {rate:8.1f}/s '
+    f'{s.bytes / 1e6:7.1f}MB  render {s.render_secs:6.2f}s minify {s.minify_secs:6.2f}s '
+    f'compress {s.compress_secs:6.2f}s write {s.write_secs:6.2f}s  {s.max_rss_mb:7.1f}MB rss{traced}')
+
+def max_rss_mb() -> float:
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # In KB on linux.
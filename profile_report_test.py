@@ -0,0 +1,27 @@
+import json
+import pytest
+from pyutils import *
+from pyutils.settings import config
+from profile_report import *
+
+def test_report(fs, monkeypatch):
+  monkeypatch.setitem(config, 'PROFILE_REPORT', 'data/profile.jsonl')
+  monkeypatch.setitem(config, 'PROFILE_TRACEMALLOC', False)
+  profiler = Profiler()
+  profiler.add(pages=1) # Outside of a stage, ignored.
+  with profiler.stage('pages'):
+    profiler.add(pages=1, written=1, bytes=10, render_secs=0.5)
+    profiler.add(pages=1, render_secs=0.25)
+  with profiler.stage('static'):
+    pass
+
+  profiler.report(revision=3)
+  profiler.report(revision=4)
+
+  runs = mapl(json.loads, read_lines('data/profile.jsonl'))
+  assert [ run['revision'] for run in runs ] == [3, 4]
+  pages = runs[0]['stages'][0]
+  assert (pages['name'], pages['pages'], pages['written'], pages['bytes'], pages['render_secs']) == ('pages', 2, 1, 10, 0.75)
+  assert runs[0]['total']['pages'] == 2
+  assert runs[0]['total']['max_rss_mb'] > 0
+  assert runs[0]['stages'][1]['traced_peak_mb'] is None
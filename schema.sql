@@ -6,7 +6,9 @@ CREATE TABLE puzzles (
   ,center_letter TEXT NOT NULL
   ,outer_letters TEXT NOT NULL
   ,missing_answers TEXT NOT NULL -- JSON serialized List[str]
-  ,hints TEXT NOT NULL -- JSON serialized List[Hints]
+  ,hints TEXT NOT NULL -- JSON serialized List[Hints], encoded with the DB codec (see codec.py)
+  -- Revision of the last change to the row, set by the DB methods. Not in the storage classes.
+  ,revision INTEGER NOT NULL DEFAULT 0
 );
 
 CREATE TABLE answers (
@@ -15,6 +17,7 @@ CREATE TABLE answers (
   ,is_pangram BOOL NOT NULL
   ,puzzle_id INTEGER NOT NULL
   ,clue_id INTEGER
+  ,revision INTEGER NOT NULL DEFAULT 0
   ,FOREIGN KEY (puzzle_id) REFERENCES puzzles (id) ON DELETE CASCADE
   ,FOREIGN KEY (clue_id) REFERENCES clues (id) ON DELETE CASCADE
   ,UNIQUE(word, puzzle_id)
@@ -27,20 +30,41 @@ CREATE TABLE clues (
   -- Clues that only differ by punctuation etc. will have the same URL.
   -- So this column is not unique.
   ,url TEXT NOT NULL
+  -- The clue archive page of the clue, see get_clue_archive_prefix.
+  ,archive_prefix TEXT NOT NULL DEFAULT ''
+  ,revision INTEGER NOT NULL DEFAULT 0
 );
 
 CREATE TABLE definitions (
   word TEXT PRIMARY KEY
-  ,definitions TEXT NOT NULL -- JSON serialized GDefinition
+  ,definitions TEXT NOT NULL -- JSON serialized GDefinitions, without the raw API responses, encoded with the DB codec
+  ,raw TEXT NOT NULL -- JSON serialized List[Any] of the raw API responses, encoded with the DB codec
+  ,revision INTEGER NOT NULL DEFAULT 0
 );
 
 CREATE TABLE imported (
   name TEXT PRIMARY KEY
 );
 
+-- Settings kept with the data, e.g. the current revision.
+CREATE TABLE meta (
+  key TEXT PRIMARY KEY
+  ,value TEXT NOT NULL
+);
+
 CREATE TABLE generated (
   path TEXT PRIMARY KEY
   ,lastmod TEXT NOT NULL
   ,needs_regen BOOL NOT NULL
+  ,hash TEXT -- Hash of the rendered page, so unchanged pages are not rewritten.
 );
 
+-- answers(word) is covered by the UNIQUE(word, puzzle_id) index.
+CREATE INDEX IF NOT EXISTS answers_clue_id ON answers (clue_id);
+CREATE INDEX IF NOT EXISTS answers_puzzle_id ON answers (puzzle_id);
+CREATE INDEX IF NOT EXISTS clues_url ON clues (url);
+-- For finding the rows that changed since a revision.
+CREATE INDEX IF NOT EXISTS puzzles_revision ON puzzles (revision);
+CREATE INDEX IF NOT EXISTS answers_revision ON answers (revision);
+CREATE INDEX IF NOT EXISTS clues_revision ON clues (revision);
+CREATE INDEX IF NOT EXISTS definitions_revision ON definitions (revision);
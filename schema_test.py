@@ -0,0 +1,104 @@
+import re
+import pytest
+from typing import List, Set
+from pyutils import *
+from testutils import *
+from testdata import *
+from db import *
+
+# Tables that grow with the number of puzzles, a query that scans one of these gets slower every day.
+LARGE_TABLES = {'puzzles', 'answers', 'clues', 'definitions', 'generated'}
+# Matches the table and its alias in 'FROM answers a' or 'JOIN clues AS c'.
+TABLE_ALIAS_RE = re.compile(
+  r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|LEFT|ORDER|GROUP|LIMIT)\b)(\w+))?', re.IGNORECASE)
+
+def populate(db: DB) -> None:
+  db.insert_definition(GDEF1_A)
+  id_1 = db.insert(P_1)
+  id_2 = db.insert(P_2)
+  clue_id = db.insert(CL1_A)
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_1, clue_id=clue_id))
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_2, clue_id=None))
+  db.mark_as_imported(FILE_1)
+  db.upsert_pages([Page(path='/puzzle/2024-12-24', lastmod=D1, needs_regen=False)])
+  db.commit()
+
+# The method calls to check and the tables they are expected to read all of.
+QUERIES = [
+  ('fetch_ganswers', lambda db:db.fetch_ganswers(), {'answers'}),
+  ('fetch_gwords', lambda db:db.fetch_gwords(), {'answers'}),
+  ('fetch_gpuzzles', lambda db:db.fetch_gpuzzles(answers=[]), {'puzzles'}),
+  ('fetch_puzzles_without_hints', lambda db:db.fetch_puzzles_without_hints(), {'puzzles'}),
+  ('iter_gpuzzles', lambda db:list(db.iter_gpuzzles(since=D1, until=D2, batch_size=1)), set()),
+  ('fetch_undefined_words', lambda db:db.fetch_undefined_words(), {'puzzles', 'answers'}),
+  ('fetch_definitions', lambda db:db.fetch_definitions([W1_A, W1_B]), set()),
+  ('fetch_raw', lambda db:db.fetch_raw(W1_A), set()),
+  ('get_clue_by_word', lambda db:db.get_clue_by_word(W1_A), set()),
+  ('fetch_by_id', lambda db:list(db.fetch(Puzzle, ids=[1])), set()),
+  ('upsert_puzzles', lambda db:db.upsert_puzzles([P_1, P_2]), set()),
+  ('upsert_clues', lambda db:db.upsert_clues([CL1_A, CL1_B]), set()),
+  ('upsert_answers', lambda db:db.upsert_answers([Answer(word=W1_B, is_pangram=False, puzzle_id=1, clue_id=1)]), set()),
+  ('insert_definitions', lambda db:db.insert_definitions([GDefinitions(word=W1_B, defs=[])]), set()),
+  ('is_imported', lambda db:db.is_imported(FILE_1), set()),
+  ('mark_as_imported', lambda db:db.mark_as_imported(FILE_2), set()),
+  ('upsert_pages', lambda db:db.upsert_pages([Page(path='/puzzle/2024-12-29', lastmod=D2, needs_regen=True)]), set()),
+  ('get_pages', lambda db:list(db.get_pages()), {'generated'}),
+  ('changed_since', lambda db:db.changed_since(0, 1), set()),
+]
+
+def scanned_tables(db: DB, sql: str) -> Set[str]:
+  """ The large tables that `sql` reads all the rows of. """
+  aliases = {}
+  for table, alias in TABLE_ALIAS_RE.findall(sql):
+    aliases[table] = table
+    if alias:
+      aliases[alias] = table
+  result = set()
+  for row in db.conn.execute('EXPLAIN QUERY PLAN ' + sql):
+    match = re.match(r'SCAN (\w+)', row['detail'])
+    if match and aliases.get(match.group(1)) in LARGE_TABLES:
+      result.add(aliases[match.group(1)])
+  return result
+
+@pytest.mark.parametrize('name,call,allowed', QUERIES, ids=[ q[0] for q in QUERIES ])
+def test_query_plans_dont_scan_large_tables(temp_db, name, call, allowed):
+  db = DB()
+  populate(db)
+  db.definitions_cache.entries.clear()
+
+  statements: List[str] = []
+  db.conn.set_trace_callback(statements.append)
+  call(db)
+  db.conn.set_trace_callback(None)
+
+  statements = [ s for s in statements if s.split()[0].upper() not in ('BEGIN', 'COMMIT', 'PRAGMA') ]
+  assert statements, f"{name} did not run any queries"
+  for sql in statements:
+    assert scanned_tables(db, sql) <= allowed, f"{name} scans a large table:\n{sql}"
+
+def test_migrate_adds_indexes(temp_db):
+  db = DB()
+  query = "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name"
+  indexes = db._fetch_values(query)
+  db.conn.executescript("""
+    DROP INDEX answers_clue_id;
+    DROP INDEX clues_url;
+    PRAGMA user_version = 1;""")
+
+  db.migrate()
+
+  assert 'answers_clue_id' in indexes
+  assert db._fetch_values(query) == indexes
+
+def test_migrate_drops_needs_regen_index(temp_db):
+  db = DB()
+  query = "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name"
+  indexes = db._fetch_values(query)
+  db.conn.executescript("""
+    CREATE INDEX generated_needs_regen ON generated (path) WHERE needs_regen;
+    PRAGMA user_version = 6;""")
+
+  db.migrate()
+
+  assert 'generated_needs_regen' not in indexes
+  assert db._fetch_values(query) == indexes
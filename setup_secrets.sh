@@ -29,10 +29,10 @@ if [ ! -f secrets/admin-password.txt ]; then
   password > secrets/admin-password.txt
 fi
 
-## Setup admin password
+## Setup MW api key
 if [ ! -f secrets/mw-api-key.txt ]; then
   echo Creating MW api key...
-  echo 96fd70b1-b580-4119-b2ce-25e0988a2252 > secrets/mw-api-key.txt
+  echo ${MW_API_KEY:?Set MW_API_KEY to the Merriam-Webster api key} > secrets/mw-api-key.txt
 fi
 
 # elasticsearch refuses to start if permissions are not correct.
@@ -1,10 +1,35 @@
+import os
+import sys
 import json
+import unicodedata
 from typing import List, Any, Dict, Optional
-from jinja2 import Environment
+from jinja2 import Environment, FileSystemBytecodeCache
 from pyutils.settings import config
 from pyutils import *
 from model import *
 
+def write_replace(path: str, contents: str | bytes, create_dirs: bool=True) -> None:
+  """
+    Write the file as a new file that replaces the old one, instead of overwriting the old one. The generations
+    of the site share the files that didn't change as hard links, this keeps the other generations unchanged.
+  """
+  tmp_path = path + '.tmp'
+  write(tmp_path, contents, create_dirs=create_dirs, binary=isinstance(contents, bytes))
+  os.replace(tmp_path, path)
+
+def set_bytecode_cache(env: Environment, name: str) -> None:
+  """
+    Keep the compiled templates in JINJA_CACHE_DIR, so that a new process only compiles the templates that changed.
+    Jinja checks the source checksum of each cached template. The compiled code also depends on the python version
+    and the env options, so each env (`name`) and version has its own files.
+  """
+  if not config['JINJA_CACHE_DIR']:
+    return
+  mkdir(config['JINJA_CACHE_DIR'])
+  version = f'py{sys.version_info.major}{sys.version_info.minor}'
+  options = f'{int(env.trim_blocks)}{int(env.lstrip_blocks)}'
+  env.bytecode_cache = FileSystemBytecodeCache(config['JINJA_CACHE_DIR'], f'%s.{name}-{version}-{options}.cache')
+
 def set_env_globals(env: Optional[Environment]) -> None:
   config['JS_VERSION'] = md5('static_files/static/script.js')
 
@@ -62,6 +87,20 @@ def url_for(o: Any, arg1=None, arg2=None) -> str:
 
   raise Exception(f"Unhandled url_for '{o}' arg1={arg1} arg2={arg2}")
 
+def get_clue_archive_prefix(text: str) -> str:
+  """ The clue archive page of a clue: its first letter, '0-9' or 'symbols'. It is stored with the clue by the importer. """
+  text = re.sub('^[\'"“”‘ ]+', '', text) # Remove quotes and whitespace.
+  # Try to normalize the first character to ascii, fall back to the original character.
+  first = text[0:1]
+  first = unicodedata.normalize('NFKD', first).encode('ascii', 'ignore').decode('ascii') or first
+  prefix = first[0:1].lower() # URLs use lowercase, uppercase is only used for display.
+  if prefix.isalpha() and prefix.isascii():
+    return prefix
+  if prefix.isdigit():
+    return '0-9'
+  else:
+    return 'symbols'
+
 def get_content_group(url: str) -> str:
   prefixes = {
     '/index.html':     'Home Page',
@@ -0,0 +1,90 @@
+import os
+import hashlib
+from html import escape
+from typing import List, Dict, Iterable, Optional, Tuple, TextIO
+from pyutils import *
+from storage import Page
+
+# The sitemap is split by section, each section has as many files (shards) as it needs for the 50k urls limit.
+# The sections are listed by sitemap_index.xml, which is the sitemap that is submitted to the search engines.
+SECTIONS = [
+  ('puzzles', ['/puzzle/']),
+  ('clues', ['/clue/']),
+  ('archives', ['/clues/', '/puzzles/']),
+  ('pages', ['/']), # The other pages, like the main page and about.
+]
+MAX_URLS = 50_000
+INDEX = 'sitemap_index.xml'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+def get_section(path: str) -> Optional[str]:
+  """ The section of the page at `path`, None for the pages that are not in the sitemap. """
+  if path.startswith('/definition'):
+    return None # These are noindex.
+  for section, prefixes in SECTIONS:
+    if any(map(path.startswith, prefixes)):
+      return section
+  return None
+
+def section_hashes(pages: Iterable[Page], domain: str) -> Dict[str, str]:
+  """ A hash of the urls and lastmods of the pages in each section, it changes when the section's sitemap changes. """
+  hashes = { section: hashlib.md5(domain.encode('utf-8')) for section, _ in SECTIONS }
+  for page in pages:
+    section = get_section(page.path)
+    if section:
+      hashes[section].update(f'{page.path}\t{page.lastmod}\n'.encode('utf-8'))
+  return { section: h.hexdigest() for section, h in hashes.items() }
+
+def shard_name(section: str, n: int) -> str:
+  return f'sitemap-{section}-{n}.xml'
+
+def url_entry(tag: str, loc: str, lastmod: Optional[str]) -> str:
+  lastmod_tag = f'<lastmod>{lastmod}</lastmod>' if lastmod else ''
+  return f'<{tag}><loc>{escape(loc, quote=False)}</loc>{lastmod_tag}</{tag}>\n'
+
+class SectionWriter:
+  """
+    Writes the urls of a section to its shards as they are added, so they are never all in memory.
+    A shard is written to a temp file that replaces the old one when it is complete, like `write_replace`.
+  """
+  def __init__(self, out_dir: str, domain: str, section: str):
+    self.out_dir = out_dir
+    self.domain = domain
+    self.section = section
+    self.shards: List[Tuple[str, str]] = [] # The file name and lastmod of each shard.
+    self.file: Optional[TextIO] = None
+    self.count = 0
+    self.lastmod = ''
+
+  def add(self, page: Page) -> None:
+    if self.file is None or self.count == MAX_URLS:
+      self.close_shard()
+      self.file = open(self.tmp_path(len(self.shards) + 1), 'w', encoding='utf-8')
+      self.file.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{XMLNS}">\n')
+    self.file.write(url_entry('url', self.domain + page.path, page.lastmod))
+    self.count += 1
+    self.lastmod = max(self.lastmod, page.lastmod or '')
+
+  def close_shard(self) -> None:
+    if self.file is None:
+      return
+    self.file.write('</urlset>\n')
+    self.file.close()
+    self.file = None
+    name = shard_name(self.section, len(self.shards) + 1)
+    os.replace(self.tmp_path(len(self.shards) + 1), joinp(self.out_dir, name))
+    self.shards.append((name, self.lastmod))
+    self.count = 0
+    self.lastmod = ''
+
+  def close(self) -> List[Tuple[str, str]]:
+    """ Finish the last shard, returns the shards that were written. """
+    self.close_shard()
+    return self.shards
+
+  def tmp_path(self, n: int) -> str:
+    return joinp(self.out_dir, shard_name(self.section, n) + '.tmp')
+
+def render_index(domain: str, shards: List[Tuple[str, str]]) -> str:
+  entries = ''.join(url_entry('sitemap', f'{domain}/{name}', lastmod) for name, lastmod in shards)
+  return f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{XMLNS}">\n{entries}</sitemapindex>\n'
@@ -0,0 +1,35 @@
+import pytest
+import sitemap
+from pyutils import *
+from storage import Page
+from sitemap import *
+
+def test_get_section():
+  assert get_section('/puzzle/2025-01-01') == 'puzzles'
+  assert get_section('/clue/a') == 'clues'
+  assert get_section('/clues/a/1') == 'archives'
+  assert get_section('/puzzles/2025/01') == 'archives'
+  assert get_section('/about') == 'pages'
+  assert get_section('/definition/a') is None
+
+def test_section_writer_shards(fs, monkeypatch):
+  monkeypatch.setattr(sitemap, 'MAX_URLS', 2)
+  mkdir('site')
+  writer = SectionWriter('site', 'https://a.b', 'clues')
+  for path, lastmod in [('/clue/a', '2025-01-02'), ('/clue/b', '2025-01-01'), ('/clue/c&d', '2025-01-03')]:
+    writer.add(Page(path=path, lastmod=lastmod, needs_regen=False))
+
+  assert writer.close() == [('sitemap-clues-1.xml', '2025-01-02'), ('sitemap-clues-2.xml', '2025-01-03')]
+  assert read('site/sitemap-clues-2.xml') == joinl([
+    '<?xml version="1.0" encoding="UTF-8"?>',
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    '<url><loc>https://a.b/clue/c&amp;d</loc><lastmod>2025-01-03</lastmod></url>',
+    '</urlset>'])
+  assert '<loc>https://a.b/sitemap-clues-1.xml</loc>' in render_index('https://a.b', writer.shards)
+
+def test_section_hashes():
+  pages = [Page(path='/clue/a', lastmod='2025-01-01', needs_regen=False)]
+  hashes = section_hashes(pages, 'https://a.b')
+  assert hashes['puzzles'] == section_hashes([], 'https://a.b')['puzzles']
+  assert hashes['clues'] != section_hashes([], 'https://a.b')['clues']
+  assert hashes['clues'] != section_hashes(pages, 'https://c.d')['clues']
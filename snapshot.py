@@ -0,0 +1,39 @@
+from types import MappingProxyType
+from typing import List, Any, Dict, Optional, Mapping
+from collections import defaultdict
+from pyutils import *
+from model import *
+from db import DB
+
+class Snapshot:
+  """
+    Read-only view of all the puzzles, answers, clue pages and words in the db. It is loaded once
+    per generator run, so every stage sees the same data and the db is only read once.
+    Don't modify the objects, they are shared between the stages.
+  """
+  def __init__(self, answers: List[GAnswer], puzzles: List[GPuzzle], clue_pages: List[GCluePage],
+      words: List[GWordDefinition], revision: int=0):
+    self.answers = answers # Sorted by word, then most recent first.
+    self.puzzles = puzzles # Most recent first.
+    self.clue_pages = clue_pages # Sorted by url.
+    self.words = words # Sorted by word.
+    self.revision = revision # The revision of the db that was read.
+
+    self.puzzles_by_date: Mapping[str, GPuzzle] = MappingProxyType({ p.date: p for p in puzzles })
+    self.clue_pages_by_url: Mapping[str, GCluePage] = MappingProxyType({ p.url: p for p in clue_pages })
+    answers_by_date = defaultdict(list)
+    for answer in answers:
+      answers_by_date[answer.puzzle_date].append(answer)
+    self.answers_by_date: Mapping[str, List[GAnswer]] = MappingProxyType(dict(answers_by_date))
+
+  @staticmethod
+  def load(db: DB) -> 'Snapshot':
+    with db.read_transaction():
+      revision = db.get_revision()
+      answers = db.fetch_ganswers()
+      puzzles = db.fetch_gpuzzles(answers=answers)
+    clue_pages = db.fetch_gclue_pages(answers=answers)
+    words = db.fetch_gwords(answers=answers)
+    log(f'Loaded snapshot: {len(puzzles):,} puzzles, {len(answers):,} answers, '
+      f'{len(clue_pages):,} clue pages, {len(words):,} words.')
+    return Snapshot(answers, puzzles, clue_pages, words, revision)
@@ -0,0 +1,26 @@
+import pytest
+from pyutils import *
+from testutils import *
+from testdata import *
+from db import *
+from snapshot import Snapshot
+
+def test_snapshot_indexes(temp_db):
+  db = DB()
+  id_1 = db.insert(P_1)
+  id_2 = db.insert(P_2)
+  clue_id = db.insert(CL1_A)
+  db.insert(Answer(word=W1_A, is_pangram=True, puzzle_id=id_1, clue_id=clue_id))
+  db.insert(Answer(word=W1_B, is_pangram=False, puzzle_id=id_2, clue_id=None))
+
+  data = Snapshot.load(db)
+
+  assert data.answers == db.fetch_ganswers()
+  assert data.puzzles == db.fetch_gpuzzles()
+  assert data.clue_pages == db.fetch_gclue_pages()
+  assert data.words == db.fetch_gwords()
+  assert list(data.puzzles_by_date.keys()) == [D2, D1]
+  assert mapl(lambda x:x.word, data.answers_by_date[D1]) == [W1_A]
+  assert list(data.clue_pages_by_url.keys()) == [U1_A]
+  assert data.puzzles_by_date[D1].answers == data.answers_by_date[D1]
+  assert data.revision == db.get_revision() == 1
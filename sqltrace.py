@@ -0,0 +1,188 @@
+import re
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from dataclasses import dataclass, asdict
+from typing import List, Any, Dict, Optional
+from pyutils import *
+from pyutils.settings import config
+
+# The call site of a statement is the DB method that ran it and the code that called that method.
+THIS_FILE = basename(__file__)
+DB_SOURCE = 'db.py'
+
+@dataclass
+class SqlStats:
+  """ The statements run from one call site. """
+  site: str
+  sql: str # The first statement, for the report.
+  calls: int = 0
+  rows: int = 0
+  secs: float = 0
+  slow: int = 0
+
+class Tracer:
+  """
+    Collects the wall time and rows of every statement run through a TracedCursor, grouped by call site.
+    A statement that takes longer than SQL_SLOW_MS is logged to SQL_SLOW_LOG. The stats are logged at exit
+    and written to SQL_TRACE_REPORT as JSON, if it is set.
+  """
+  def __init__(self):
+    self.stats: Dict[str, SqlStats] = {}
+    self.lock = threading.Lock()
+    self.slow_secs = config['SQL_SLOW_MS'] / 1000
+
+  def record(self, query: 'Query') -> None:
+    with self.lock:
+      stats = self.stats.get(query.site)
+      if stats is None:
+        stats = self.stats[query.site] = SqlStats(site=query.site, sql=normalize_sql(query.sql))
+      stats.calls += 1
+      stats.rows += query.rows
+      stats.secs += query.secs
+      is_slow = self.slow_secs and query.secs >= self.slow_secs
+      if is_slow:
+        stats.slow += 1
+    if config['DEBUG_DB']:
+      log(f"SQL {query.secs*1000:.1f}ms {query.rows} rows {query.site}: {normalize_sql(query.sql)}")
+    if is_slow and config['SQL_SLOW_LOG']:
+      append(config['SQL_SLOW_LOG'], f"[{timestamp(access_log=False)}] {query.secs*1000:.1f}ms "
+        f"{query.rows} rows {query.site}\n{query.sql.strip()}\n")
+
+  def report(self) -> None:
+    with self.lock:
+      stats = sorted(self.stats.values(), key=lambda s:s.secs, reverse=True)
+    if not stats:
+      return
+    lines = [ f"{s.secs:8.3f}s {s.calls:7,} calls {s.rows:9,} rows {s.slow:4} slow  {s.site}" for s in stats[:20] ]
+    log(f"SQL stats, {sum(s.calls for s in stats):,} statements in {sum(s.secs for s in stats):.3f}s:\n"
+      + joinl(lines))
+    if config['SQL_TRACE_REPORT']:
+      write(config['SQL_TRACE_REPORT'], json.dumps([ asdict(s) for s in stats ], indent=2), create_dirs=True)
+      log(f"Wrote SQL stats to {config['SQL_TRACE_REPORT']}")
+
+tracer: Optional[Tracer] = None
+
+def get_tracer() -> Tracer:
+  global tracer
+  if tracer is None:
+    tracer = Tracer()
+    atexit.register(tracer.report)
+  return tracer
+
+@dataclass
+class Query:
+  """ One execution of a statement, the time includes fetching the rows. """
+  sql: str
+  site: str
+  secs: float = 0
+  rows: int = 0
+
+class TracedCursor(sqlite3.Cursor):
+  """ Times the statements and counts the rows they return. A statement is recorded once all its rows were read. """
+  query: Optional[Query] = None
+
+  def execute(self, sql, parameters=()):
+    self._finish()
+    self.query = Query(sql=sql, site=call_site())
+    start = time.perf_counter()
+    try:
+      return super().execute(sql, parameters)
+    finally:
+      self.query.secs += time.perf_counter() - start
+      if not self.description: # Statements that don't return rows are done.
+        self._finish()
+
+  def executemany(self, sql, seq_of_parameters):
+    self._finish()
+    self.query = Query(sql=sql, site=call_site())
+    start = time.perf_counter()
+    try:
+      return super().executemany(sql, seq_of_parameters)
+    finally:
+      self.query.secs += time.perf_counter() - start
+      self._finish()
+
+  def fetchone(self):
+    start = time.perf_counter()
+    row = super().fetchone()
+    self._fetched(start, 0 if row is None else 1, done=row is None)
+    return row
+
+  def fetchmany(self, size=None):
+    start = time.perf_counter()
+    rows = super().fetchmany(size) if size is not None else super().fetchmany()
+    self._fetched(start, len(rows), done=not rows)
+    return rows
+
+  def fetchall(self):
+    start = time.perf_counter()
+    rows = super().fetchall()
+    self._fetched(start, len(rows), done=True)
+    return rows
+
+  def __next__(self):
+    start = time.perf_counter()
+    try:
+      row = super().__next__()
+    except StopIteration:
+      self._fetched(start, 0, done=True)
+      raise
+    self._fetched(start, 1, done=False)
+    return row
+
+  def close(self):
+    self._finish()
+    super().close()
+
+  def __del__(self):
+    self._finish()
+
+  def _fetched(self, start: float, n: int, done: bool) -> None:
+    if self.query is None:
+      return
+    self.query.secs += time.perf_counter() - start
+    self.query.rows += n
+    if done:
+      self._finish()
+
+  def _finish(self) -> None:
+    if self.query is not None:
+      get_tracer().record(self.query)
+      self.query = None
+
+class TracedConnection(sqlite3.Connection):
+  """ A connection whose cursors are TracedCursors, pass it as the `factory` to sqlite3.connect. """
+  def cursor(self, factory=None):
+    return super().cursor(factory or TracedCursor)
+
+  def execute(self, sql, parameters=()):
+    return self.cursor().execute(sql, parameters)
+
+  def executemany(self, sql, seq_of_parameters):
+    return self.cursor().executemany(sql, seq_of_parameters)
+
+def call_site() -> str:
+  """ Where the statement was run from: 'method/helper (db.py:line) <- caller (file:line)'. """
+  frame: Any = sys._getframe(1)
+  while frame and basename(frame.f_code.co_filename) == THIS_FILE:
+    frame = frame.f_back
+  inner = frame
+  names: List[str] = []
+  while frame and basename(frame.f_code.co_filename) == DB_SOURCE:
+    if not names or frame.f_code.co_name != names[0]:
+      names.insert(0, frame.f_code.co_name)
+    frame = frame.f_back
+  if not names: # Not run from a DB method.
+    return f"{inner.f_code.co_name} ({basename(inner.f_code.co_filename)}:{inner.f_lineno})"
+  method = names[0] if len(names) == 1 else f"{names[0]}/{names[-1]}"
+  site = f"{method} ({DB_SOURCE}:{inner.f_lineno})"
+  if frame:
+    site += f" <- {frame.f_code.co_name} ({basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+  return site
+
+def normalize_sql(sql: str, max_length: int=200) -> str:
+  return trunc(re.sub(r'\s+', ' ', sql).strip(), max_=max_length)
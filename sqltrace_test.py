@@ -0,0 +1,38 @@
+import json
+import pytest
+import sqltrace
+from pyutils import *
+from testutils import *
+from testdata import *
+from db import *
+
+@pytest.fixture
+def tracer(temp_db, monkeypatch) -> sqltrace.Tracer:
+  monkeypatch.setitem(config, 'SQL_TRACE', True)
+  monkeypatch.setitem(config, 'SQL_SLOW_MS', 0.000001)
+  monkeypatch.setitem(config, 'SQL_SLOW_LOG', 'slow.log')
+  monkeypatch.setitem(config, 'SQL_TRACE_REPORT', 'data/sql.json')
+  tracer = sqltrace.Tracer()
+  monkeypatch.setattr(sqltrace, 'tracer', tracer)
+  return tracer
+
+def test_trace_statements(tracer):
+  db = DB()
+  assert isinstance(db.conn, sqltrace.TracedConnection)
+  db.upsert_puzzles([P_1, P_2])
+  for i in range(2):
+    db.fetch_gpuzzles()
+
+  sites = { site.split(' ')[0]: stats for site,stats in tracer.stats.items() }
+  stats = sites['fetch_gpuzzles/_fetch_ganswers']
+  assert stats.calls == 2
+  assert 'test_trace_statements (sqltrace_test.py' in stats.site
+  assert stats.sql.startswith('WITH latest_clues AS')
+  assert sites['fetch_gpuzzles/iter_gpuzzles'].rows == 4 # 2 puzzles, read twice.
+  assert sites['upsert_puzzles/_upsert_all'].calls == 1
+  assert sites['upsert_puzzles/_upsert_all'].slow == 1
+  assert 'INTO puzzles(date' in read('slow.log')
+
+  tracer.report()
+  report = json.loads(read('data/sql.json'))
+  assert sum(s['calls'] for s in report) == sum(s.calls for s in tracer.stats.values())
@@ -8,7 +8,7 @@ class Puzzle:
   center_letter: str
   outer_letters: str
   missing_answers: str
-  hints: str
+  hints: str | bytes # Encoded with the DB codec, or '' when the hints weren't created yet.
   id: Optional[int] = None
 
 @dataclass
@@ -23,16 +23,20 @@ class Answer:
 class Clue:
   text: str
   url: str
+  archive_prefix: str = '' # The clue archive page, set by DB.upsert_clues if it is not set.
   id: Optional[int] = None
 
 @dataclass
 class Definition:
   word: str
-  # JSON serialized GDefinitions
-  definitions: str
+  # JSON serialized GDefinitions, without the raw API responses. Encoded with the DB codec.
+  definitions: str | bytes
+  # JSON serialized list of the raw API responses, one for each definition. Encoded with the DB codec.
+  raw: str | bytes
 
 @dataclass
 class Page:
   path: str
   lastmod: str
   needs_regen: bool
+  hash: Optional[str] = None
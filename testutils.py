@@ -8,6 +8,7 @@ from pyutils import *
 from pyutils.settings import config
 from testdata import HS_1
 import db
+import generator as site_generator
 
 @pytest.fixture
 def fake_files(fs, monkeypatch) -> None:
@@ -40,6 +41,22 @@ def temp_db(fs, monkeypatch) -> None:
   config['DB_FILE'] = 'memorydb?mode=memory&cache=shared'
   config['REQUESTS_SQLITE_CACHE'] = ':memory:'
 
+@pytest.fixture
+def generator_config(temp_db, monkeypatch) -> None:
+  """ The config of an incremental run of the generator into site/, for the tests that make their own Generator. """
+  monkeypatch.setitem(config, 'FULL', False)
+  monkeypatch.setitem(config, 'SITE_DIR', 'site/')
+  monkeypatch.setitem(config, 'SERVING_DEST', 'site/current')
+  write('static_files/static/script.js', '', create_dirs=True)
+
+@pytest.fixture
+def generator(generator_config) -> 'site_generator.Generator':
+  return site_generator.Generator()
+
+@pytest.fixture
+def fake_mw_api_key(fs) -> None:
+  write(config.get('MW_API_KEY_FILE'), 'test-mw-api-key', create_dirs=True)
+
 @pytest.fixture
 def mock_es(fs) -> Generator:
   write(config.get('ELASTIC_API_KEY_FILE'), 'test-elastic-api-key', create_dirs=True)
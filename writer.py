@@ -0,0 +1,83 @@
+import os
+import time
+import queue
+import threading
+from typing import List, Dict, Set, Tuple, Optional
+from pyutils import *
+from site_util import write_replace
+from compress import write_sidecars
+
+# A file to write: its path, contents and compressed sidecars. None tells the thread to stop.
+Job = Optional[Tuple[str, bytes, Dict[str, bytes]]]
+
+class Writer:
+  """
+    Writes the generated files in background threads, so rendering doesn't wait for the disk. Each file is
+    written to a temp file that replaces the old one, so the serving dir never has a half written page.
+    A path is always written by the same thread, so the writes of a path happen in order. The queues are
+    bounded, when they are full the generator waits for the threads to catch up.
+    With 0 threads the files are written when they are queued.
+  """
+  def __init__(self, n_threads: int, queue_size: int):
+    self.dirs: Set[str] = set() # The dirs that were created.
+    self.queued: Set[str] = set() # The paths that were queued, they may not be written yet.
+    self.error: Optional[BaseException] = None
+    self.queues: List[queue.Queue[Job]] = [ queue.Queue(max(1, queue_size // max(1, n_threads))) for _ in range(n_threads) ]
+    self.threads = [ threading.Thread(target=self.run, args=(q,), daemon=True) for q in self.queues ]
+    for thread in self.threads:
+      thread.start()
+
+  def write(self, path: str, data: bytes, sidecars: Dict[str, bytes]) -> float:
+    """ Queue the file and its sidecars to be written, returns how long it waited for a place in the queue. """
+    self.check()
+    dir = os.path.dirname(path)
+    if dir not in self.dirs:
+      mkdir(dir)
+      self.dirs.add(dir)
+    self.queued.add(path)
+    if not self.queues:
+      write_file(path, data, sidecars)
+      return 0
+    start = time.perf_counter()
+    self.queues[hash(path) % len(self.queues)].put((path, data, sidecars))
+    return time.perf_counter() - start
+
+  def exists(self, path: str) -> bool:
+    """ If the file exists or is queued to be written. """
+    return path in self.queued or exists(path)
+
+  def wait(self) -> None:
+    """ Wait until all the queued files are written. """
+    for q in self.queues:
+      q.join()
+    self.check()
+
+  def close(self) -> None:
+    self.wait()
+    for q in self.queues:
+      q.put(None)
+    for thread in self.threads:
+      thread.join()
+    self.queues, self.threads = [], []
+
+  def check(self) -> None:
+    """ Raise the first error of the threads in the generator. """
+    if self.error:
+      raise Exception('Failed to write the generated files') from self.error
+
+  def run(self, q: 'queue.Queue[Job]') -> None:
+    while True:
+      job = q.get()
+      try:
+        if job is None:
+          return
+        if not self.error: # Stop writing after an error, the generator fails at the next write.
+          write_file(*job)
+      except BaseException as e:
+        self.error = self.error or e
+      finally:
+        q.task_done()
+
+def write_file(path: str, data: bytes, sidecars: Dict[str, bytes]) -> None:
+  write_replace(path, data, create_dirs=False)
+  write_sidecars(path, sidecars, create_dirs=False)
@@ -0,0 +1,28 @@
+import pytest
+from pyutils import *
+from writer import Writer
+
+DATA = b'<html>' + b'spelling bee ' * 200 + b'</html>'
+
+@pytest.mark.parametrize('n_threads', [0, 2])
+def test_write(fs, n_threads):
+  writer = Writer(n_threads, 4)
+  for i in range(20):
+    writer.write(f'site/clue/{i % 3}', str(i).encode('utf-8'), {'.gz': b'gz'} if i < 19 else {})
+  assert writer.exists('site/clue/0')
+  writer.close()
+
+  # The last write of each path wins.
+  assert mapl(read, ['site/clue/0', 'site/clue/1', 'site/clue/2']) == ['18', '19', '17']
+  assert writer.dirs == {'site/clue'}
+  assert read('site/clue/0.gz') == 'gz'
+  assert not exists('site/clue/1.gz')
+  assert not ls('site/clue/*.tmp')
+
+def test_write_error(fs):
+  writer = Writer(1, 4)
+  writer.write('site/a', DATA, {})
+  writer.dirs.add('missing') # The dir won't be created.
+  writer.write('missing/b', DATA, {})
+  with pytest.raises(Exception, match='Failed to write'):
+    writer.wait()